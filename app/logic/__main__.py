@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Консольный вход в логику без Kivy: python -m app.logic <команда> <файлы данных...>
+# Каждый файл обрабатывается отдельно, результат - одна строка JSON на файл.
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from app.logic.analytics import FORMULAS
+from app.logic.logic import ProgressiveOverloadLogic
+from app.logic.progression import calculate_next_target
+from app.logic.storage import STORAGE_BACKENDS, detect_backend
+
+
+def _targets(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    programs = []
+    for program in logic.list_programs():
+        progression_type = program.get("progressionType", "double")
+        exercises = []
+        for ex in program.get("exercises", []):
+            last = logic.storage.last_exercise_record(ex["id"])
+            exercises.append({
+                "id": ex["id"],
+                "name": ex.get("name", ""),
+                "lastWorkout": last.date if last is not None else None,
+                "nextTarget": calculate_next_target(ex, last, progression_type),
+            })
+        programs.append({"id": program["id"], "name": program.get("name", ""), "exercises": exercises})
+    return {"programs": programs}
+
+
+def _summary(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    sessions = logic.sessions_between(args.since, args.until)
+    active = logic.get_active_program()
+    return {
+        "programs": len(logic.list_programs()),
+        "activeProgram": active.get("name") if active else None,
+        "sessions": len(sessions),
+        "firstDate": sessions[0].get("date") if sessions else None,
+        "lastDate": sessions[-1].get("date") if sessions else None,
+        "sets": sum(len(e.get("sets", [])) for s in sessions for e in s.get("exercises", [])),
+    }
+
+
+def _analytics(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    exercise_ids = args.exercise or [ex["id"] for p in logic.list_programs() for ex in p.get("exercises", [])]
+    result = logic.get_exercise_analytics(exercise_ids, tuple(args.formula or FORMULAS), since=args.since)
+    return {str(ex_id): stats for ex_id, stats in result.items()}
+
+
+def _import(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    if not args.input:
+        raise ValueError("--input is required for import")
+    report = logic.import_history(args.input, args.format, strict=not args.lenient)
+    logic.flush()
+    return asdict(report)
+
+
+def _export(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    if not args.output:
+        raise ValueError("--output is required for export")
+    # {name} - имя файла данных без расширения, чтобы выгрузить несколько файлов за раз
+    path = args.output.replace("{name}", os.path.splitext(os.path.basename(args.data_file))[0])
+    rows = logic.export_history(
+        path,
+        "jsonl" if args.format == "json" else args.format,
+        program_ids=set(args.program) if args.program else None,
+        exercise_ids=set(args.exercise) if args.exercise else None,
+        start=args.since,
+        end=args.until,
+    )
+    return {"output": path, "rows": rows}
+
+
+def _replay(logic: ProgressiveOverloadLogic, args: argparse.Namespace) -> Dict[str, Any]:
+    changed = logic.replay_targets(args.exercise, full=True, parallel=False if args.serial else None)
+    logic.flush()
+    return {"changed": changed}
+
+
+# какие данные на диске бэкенд прочитает целиком (None - файла ещё нет): json не видит журнала,
+# json и journal - сегментов и базы; segmented и sqlite сами мигрируют любой формат
+BACKEND_READS = {
+    "json": (None, "json"),
+    "journal": (None, "json", "journal"),
+}
+# так же, как в приложении (main.py)
+DEFAULT_BACKEND = "segmented"
+
+
+def resolve_backend(data_file: str, requested: str) -> str:
+    detected = detect_backend(data_file)
+    if requested == "auto":
+        return detected or DEFAULT_BACKEND
+    if requested in BACKEND_READS and detected not in BACKEND_READS[requested]:
+        # иначе команда увидит пустую историю, а save() перезапишет файл в чужом формате
+        raise ValueError(f"{data_file} is stored as {detected}, not {requested}; use --backend {detected} or auto")
+    return requested
+
+
+COMMANDS = {
+    "targets": _targets,
+    "summary": _summary,
+    "analytics": _analytics,
+    "import": _import,
+    "export": _export,
+    "replay": _replay,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.logic", description="Прогрессия, сводка и аналитика по файлам данных")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("data_files", nargs="+", help="файлы данных приложения (app_data.json и т.п.)")
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto"] + sorted(STORAGE_BACKENDS) + ["segmented", "sqlite"],
+        help="формат хранилища; auto - по данным на диске (новый файл - segmented), "
+        "segmented и sqlite при первом открытии мигрируют остальные форматы",
+    )
+    parser.add_argument("--since", help="начало периода (YYYY-MM-DD), включительно")
+    parser.add_argument("--until", help="конец периода (YYYY-MM-DD), не включительно")
+    parser.add_argument("--exercise", type=int, action="append", help="id упражнения (можно несколько раз)")
+    parser.add_argument("--formula", action="append", choices=FORMULAS, help="формула 1ПМ (можно несколько раз)")
+    parser.add_argument("--program", type=int, action="append", help="export: id программы (можно несколько раз)")
+    parser.add_argument("--input", help="import: CSV (строка на подход) или JSON/JSONL с тренировками")
+    parser.add_argument("--output", help="export: файл .csv (строка на подход) или .jsonl (тренировка на строку), можно с {name}")
+    parser.add_argument(
+        "--format", choices=("csv", "json", "jsonl"), help="import/export: формат файла, по умолчанию по расширению"
+    )
+    parser.add_argument("--lenient", action="store_true", help="import: пропускать ошибочные строки вместо отмены импорта")
+    parser.add_argument("--serial", action="store_true", help="replay: считать в одном процессе")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    command = COMMANDS[args.command]
+    status = 0
+    if args.command == "export" and args.output and len(args.data_files) > 1 and "{name}" not in args.output:
+        build_parser().error("export of several data files needs {name} in --output")
+    for data_file in args.data_files:
+        args.data_file = data_file
+        try:
+            logic = ProgressiveOverloadLogic(data_file, resolve_backend(data_file, args.backend))
+            output = {"file": data_file, args.command: command(logic, args)}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            output = {"file": data_file, "error": f"{type(e).__name__}: {e}"}
+            status = 1
+        print(json.dumps(output, ensure_ascii=False, default=str))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+from itertools import chain, repeat
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.logic.models import ExerciseColumns, ExerciseRecord, record_columns
+
+_np: Any = None
+
+
+def _numpy() -> Any:
+    # numpy импортируется при первом расчёте, а не при импорте пакета: импорт numpy
+    # заметно дольше остальной логики. Под Android numpy нет - считаем на чистом Python.
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np or None
+
+
+FORMULAS = ("epley", "brzycki", "lombardi")
+
+
+def _one_rep_max(formula: str, weight: float, reps: int) -> float:
+    if reps <= 0 or weight <= 0:
+        return 0.0
+    if reps == 1:
+        return weight
+    if formula == "epley":
+        return weight * (1 + reps / 30)
+    if formula == "brzycki":
+        return weight * 36 / (37 - reps) if reps < 37 else 0.0
+    if formula == "lombardi":
+        return weight * reps ** 0.1
+    raise ValueError(f"unknown 1RM formula: {formula}")
+
+
+def _stats_numpy(np: Any, n: int, columns, formulas: Sequence[str]) -> Dict[str, Any]:
+    # columns - (число рабочих подходов в каждой сессии, веса, повторы), как в record_columns
+    session_idx = np.repeat(np.arange(n, dtype=np.int64), np.asarray(columns[0], dtype=np.int64))
+    weight = np.asarray(columns[1], dtype=np.float64)
+    reps = np.asarray(columns[2], dtype=np.int64)
+
+    valid = (reps > 0) & (weight > 0)
+    single = reps == 1
+    one_rep_max: Dict[str, List[float]] = {}
+    per_set: Dict[str, Any] = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for formula in formulas:
+            if formula == "epley":
+                orm = weight * (1 + reps / 30)
+            elif formula == "brzycki":
+                orm = np.where(reps < 37, weight * 36 / (37 - reps), 0.0)
+            elif formula == "lombardi":
+                orm = weight * reps.astype(np.float64) ** 0.1
+            else:
+                raise ValueError(f"unknown 1RM formula: {formula}")
+            orm = np.where(valid, np.where(single, weight, orm), 0.0)
+            per_set[formula] = orm
+            best = np.zeros(n, dtype=np.float64)
+            np.maximum.at(best, session_idx, orm)
+            one_rep_max[formula] = best.tolist()
+
+    tonnage = np.bincount(session_idx, weights=weight * reps, minlength=n)
+
+    # лучший подход сессии - с максимальным 1ПМ по первой формуле (при равенстве - первый по порядку)
+    best_set: List[Optional[Tuple[float, int]]] = [None] * n
+    if len(session_idx):
+        key = per_set[formulas[0]] if formulas else weight * reps
+        order = np.lexsort((-np.arange(len(key)), key, session_idx))
+        last_of_group = np.r_[session_idx[order][1:] != session_idx[order][:-1], True]
+        for i in order[last_of_group].tolist():
+            best_set[int(session_idx[i])] = (float(weight[i]), int(reps[i]))
+
+    return {"one_rep_max": one_rep_max, "tonnage": tonnage.tolist(), "best_set": best_set}
+
+
+def _stats_python(n: int, columns, formulas: Sequence[str]) -> Dict[str, Any]:
+    one_rep_max = {formula: [0.0] * n for formula in formulas}
+    tonnage = [0.0] * n
+    best_set: List[Optional[Tuple[float, int]]] = [None] * n
+    best_key = [float("-inf")] * n
+    session_idx = chain.from_iterable(repeat(i, count) for i, count in enumerate(columns[0]))
+    for i, weight, reps in zip(session_idx, columns[1], columns[2]):
+        tonnage[i] += weight * reps
+        key = weight * reps
+        for j, formula in enumerate(formulas):
+            orm = _one_rep_max(formula, weight, reps)
+            if orm > one_rep_max[formula][i]:
+                one_rep_max[formula][i] = orm
+            if j == 0:
+                key = orm
+        if key > best_key[i]:
+            best_key[i] = key
+            best_set[i] = (weight, reps)
+    return {"one_rep_max": one_rep_max, "tonnage": tonnage, "best_set": best_set}
+
+
+def column_stats(columns: ExerciseColumns, formulas: Sequence[str] = ("epley",)) -> Dict[str, Any]:
+    labels, counts, weights, reps = columns
+    n = len(labels)
+    np = _numpy()
+    stats = (
+        _stats_numpy(np, n, (counts, weights, reps), formulas)
+        if np is not None else _stats_python(n, (counts, weights, reps), formulas)
+    )
+    stats["labels"] = list(labels)
+    return stats
+
+
+def session_stats(records: Sequence[ExerciseRecord], formulas: Sequence[str] = ("epley",)) -> Dict[str, Any]:
+    return column_stats(record_columns(records), formulas)
+
+
+def batch_column_stats(
+    columns_by_exercise: Dict[Any, ExerciseColumns],
+    formulas: Sequence[str] = FORMULAS,
+) -> Dict[Any, Dict[str, Any]]:
+    # все упражнения считаются одним проходом по общей колонке, потом режутся обратно;
+    # число подходов хранится по сессиям, поэтому колонки склеиваются без сдвига индексов
+    exercise_ids = list(columns_by_exercise)
+    merged: ExerciseColumns = ([], [], [], [])
+    bounds: List[Tuple[int, int]] = []
+    for exercise_id in exercise_ids:
+        start = len(merged[0])
+        for column, part in zip(merged, columns_by_exercise[exercise_id]):
+            column.extend(part)
+        bounds.append((start, len(merged[0])))
+
+    stats = column_stats(merged, formulas)
+    result: Dict[Any, Dict[str, Any]] = {}
+    for exercise_id, (start, end) in zip(exercise_ids, bounds):
+        result[exercise_id] = {
+            "labels": stats["labels"][start:end],
+            "one_rep_max": {f: values[start:end] for f, values in stats["one_rep_max"].items()},
+            "tonnage": stats["tonnage"][start:end],
+            "best_set": stats["best_set"][start:end],
+        }
+    return result
+
+
+def batch_session_stats(
+    records_by_exercise: Dict[Any, Sequence[ExerciseRecord]],
+    formulas: Sequence[str] = FORMULAS,
+) -> Dict[Any, Dict[str, Any]]:
+    return batch_column_stats({ex_id: record_columns(records) for ex_id, records in records_by_exercise.items()}, formulas)
+
+
+def exercise_analytics(
+    storage: Any,
+    exercise_ids: Iterable[Any],
+    formulas: Sequence[str] = FORMULAS,
+    since: Optional[str] = None,
+) -> Dict[Any, Dict[str, Any]]:
+    # колонки отдаёт хранилище: sqlite собирает их запросом, JSON-хранилища - из готовых колонок записей
+    return batch_column_stats({ex_id: storage.exercise_columns(ex_id, since) for ex_id in exercise_ids}, formulas)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Потоковая выгрузка истории: CSV - строка на подход, JSONL - тренировка на строку.
+# Сессии идут генератором из storage.iter_sessions_between и сразу пишутся в файл,
+# поэтому история не копируется и целиком в памяти не собирается. CSV читается обратно importer-ом.
+
+from __future__ import annotations
+import csv
+import json
+from typing import IO, Any, Collection, Dict, Iterable, Iterator, Optional, Tuple
+
+CSV_COLUMNS = (
+    "session_id", "date", "program_id", "program", "exercise_id", "exercise", "set", "type", "weight", "reps",
+)
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def iter_sessions(
+    storage: Any,
+    program_ids: Optional[Collection[int]] = None,
+    exercise_ids: Optional[Collection[int]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    # [start, end) по возрастанию даты; при фильтре по упражнениям в сессии остаются только они
+    for session in storage.iter_sessions_between(start, end):
+        if program_ids is not None and session.get("programId") not in program_ids:
+            continue
+        if exercise_ids is not None:
+            entries = [e for e in session.get("exercises", []) if e.get("exerciseId") in exercise_ids]
+            if not entries:
+                continue
+            session = {**session, "exercises": entries}
+        yield session
+
+
+def iter_csv_rows(sessions: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Any, ...]]:
+    for session in sessions:
+        for entry in session.get("exercises", []):
+            for number, s in enumerate(entry.get("sets", []), start=1):
+                yield (
+                    session.get("id"), session.get("date"), session.get("programId"), session.get("programName"),
+                    entry.get("exerciseId"), entry.get("exerciseName"),
+                    number, s.get("type"), s.get("weight"), s.get("reps"),
+                )
+
+
+def write_csv(f: IO[str], sessions: Iterable[Dict[str, Any]]) -> int:
+    writer = csv.writer(f)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for row in iter_csv_rows(sessions):
+        writer.writerow(row)
+        rows += 1
+    return rows
+
+
+def write_jsonl(f: IO[str], sessions: Iterable[Dict[str, Any]]) -> int:
+    rows = 0
+    for session in sessions:
+        f.write(json.dumps(session, ensure_ascii=False))
+        f.write("\n")
+        rows += 1
+    return rows
+
+
+def export_history(f: IO[str], fmt: str, sessions: Iterable[Dict[str, Any]]) -> int:
+    # возвращает число записанных строк: подходов для CSV, тренировок для JSONL
+    if fmt == "csv":
+        return write_csv(f, sessions)
+    if fmt == "jsonl":
+        return write_jsonl(f, sessions)
+    raise ValueError(f"Unknown export format: {fmt}")
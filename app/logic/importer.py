@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+# Пакетный импорт истории из CSV (строка на подход) или JSON/JSONL (сессии в формате workoutHistory).
+# JSON/JSONL читается потоково, CSV - целиком (строки одной тренировки могут стоять где угодно);
+# сессии проверяются и копятся в памяти, а в хранилище попадают одной пачкой:
+# extend_history + пересчёт целей затронутых упражнений + один save() в WorkoutService.import_history.
+
+from __future__ import annotations
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import chain
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from app.logic.models import get_program_by_id
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+CSV_REQUIRED_COLUMNS = ("date", "exercise", "weight", "reps")
+DEFAULT_PROGRAM_NAME = "Импорт"
+
+
+class ImportValidationError(ValueError):
+    def __init__(self, errors: List[Tuple[int, str]]) -> None:
+        self.errors = errors
+        line, message = errors[0]
+        super().__init__(f"{len(errors)} invalid record(s), first at line {line}: {message}")
+
+
+@dataclass(slots=True)
+class ImportReport:
+    sessions: int = 0
+    sets: int = 0
+    duplicates: int = 0
+    programs_created: int = 0
+    exercises_created: int = 0
+    targets_updated: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+# разбор
+
+def _parse_date(value: Any) -> str:
+    text = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"bad date {text!r}")
+
+
+def _parse_set(raw: Dict[str, Any]) -> Dict[str, Any]:
+    # те же границы, что и в полях ввода на экране тренировки
+    if not isinstance(raw, dict):
+        raise ValueError("set must be an object")
+    try:
+        weight = float(raw.get("weight"))
+        reps = int(float(raw.get("reps")))
+    except (TypeError, ValueError):
+        raise ValueError(f"bad weight/reps {raw.get('weight')!r}/{raw.get('reps')!r}")
+    if not (0 <= weight < 1000):
+        raise ValueError(f"weight out of range: {weight}")
+    if not (0 <= reps < 100):
+        raise ValueError(f"reps out of range: {reps}")
+    return {"type": str(raw.get("type") or "normal"), "weight": weight, "reps": reps}
+
+
+def _optional_id(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _source_id(value: Any) -> Optional[str]:
+    # id тренировки в исходном файле: различает тренировки одной программы в одну секунду
+    text = str(value).strip() if value is not None else ""
+    return text or None
+
+
+def read_csv_sessions(f: IO[str], errors: List[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+    # строки с одной датой и программой (или одним session_id) - одна тренировка, где бы они ни стояли
+    # в файле; внутри тренировки подходы собираются по названию упражнения. Порядок строк не важен
+    # (файл может быть отсортирован по упражнению), поэтому черновики отдаются после чтения всего файла.
+    reader = csv.DictReader(f)
+    missing = [c for c in CSV_REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        errors.append((1, f"missing columns: {', '.join(missing)}"))
+        return
+
+    drafts: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    entries: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+    # у всех подходов тренировки одна дата - strptime только на новую
+    dates: Dict[str, str] = {}
+    for row in reader:
+        line = reader.line_num
+        try:
+            raw_date = row.get("date") or ""
+            date = dates.get(raw_date)
+            if date is None:
+                date = dates[raw_date] = _parse_date(raw_date)
+            exercise_name = (row.get("exercise") or "").strip()
+            if not exercise_name:
+                raise ValueError("empty exercise name")
+            new_set = _parse_set(row)
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+
+        program_name = (row.get("program") or "").strip() or DEFAULT_PROGRAM_NAME
+        session_id = _source_id(row.get("session_id"))
+        key = (session_id or date, program_name)
+        draft = drafts.get(key)
+        if draft is None:
+            draft = drafts[key] = {
+                "line": line,
+                "sessionId": session_id,
+                "date": date,
+                "programId": _optional_id(row.get("program_id")),
+                "programName": program_name,
+                "exercises": [],
+            }
+            entries[key] = {}
+        entry = entries[key].get(exercise_name)
+        if entry is None:
+            entry = entries[key][exercise_name] = {
+                "exerciseId": _optional_id(row.get("exercise_id")),
+                "exerciseName": exercise_name,
+                "sets": [],
+            }
+            draft["exercises"].append(entry)
+        entry["sets"].append(new_set)
+    yield from drafts.values()
+
+
+def _session_draft(raw: Any, line: int) -> Dict[str, Any]:
+    if not isinstance(raw, dict):
+        raise ValueError("session must be an object")
+    exercises = []
+    for entry in raw.get("exercises", []):
+        if not isinstance(entry, dict):
+            raise ValueError("exercise entry must be an object")
+        name = str(entry.get("exerciseName") or "").strip()
+        if not name:
+            raise ValueError("empty exercise name")
+        exercises.append({
+            "exerciseId": _optional_id(entry.get("exerciseId")),
+            "exerciseName": name,
+            "sets": [_parse_set(s) for s in entry.get("sets", [])],
+        })
+    return {
+        "line": line,
+        "sessionId": _source_id(raw.get("id")),
+        "date": _parse_date(raw.get("date")),
+        "programId": _optional_id(raw.get("programId")),
+        "programName": str(raw.get("programName") or "").strip() or DEFAULT_PROGRAM_NAME,
+        "exercises": exercises,
+    }
+
+
+def read_json_sessions(f: IO[str], errors: List[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+    # JSONL - по сессии на строку; иначе целый документ: список сессий или app_data с workoutHistory
+    first = f.readline()
+    try:
+        head = json.loads(first)
+    except ValueError:
+        head = None
+    if isinstance(head, dict) and "workoutHistory" not in head:
+        for line, text in enumerate(chain([first], f), start=1):
+            if not text.strip():
+                continue
+            try:
+                yield _session_draft(json.loads(text), line)
+            except ValueError as e:
+                errors.append((line, str(e)))
+        return
+
+    try:
+        document = head if head is not None else json.loads(first + f.read())
+    except ValueError as e:
+        errors.append((1, str(e)))
+        return
+    sessions = document.get("workoutHistory", []) if isinstance(document, dict) else document
+    if not isinstance(sessions, list):
+        errors.append((1, "expected a list of sessions"))
+        return
+    for index, raw in enumerate(sessions, start=1):
+        try:
+            yield _session_draft(raw, index)
+        except ValueError as e:
+            errors.append((index, str(e)))
+
+
+def read_sessions(f: IO[str], fmt: str, errors: List[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+    if fmt == "csv":
+        return read_csv_sessions(f, errors)
+    if fmt in ("json", "jsonl"):
+        return read_json_sessions(f, errors)
+    raise ValueError(f"Unknown import format: {fmt}")
+
+
+# сборка сессий для хранилища
+
+class SessionBuilder:
+    # Привязывает черновики к программам/упражнениям (по id, затем по имени, иначе создаёт),
+    # выдаёт id и отсеивает тренировки, которые уже есть в истории (та же дата и программа;
+    # разные id из файла в одну секунду - разные тренировки).
+
+    def __init__(self, storage: Any, report: ImportReport, progression_type: str = "double") -> None:
+        self.storage = storage
+        self.report = report
+        self.progression_type = progression_type
+        self.touched: Dict[int, Dict[str, Any]] = {}
+        self._programs_by_name = {p.get("name"): p for p in reversed(storage.get().get("programs", []))}
+        # (дата, программа) -> (сколько таких тренировок уже было в истории, id из файла)
+        self._seen: Dict[Tuple[str, Any], Tuple[int, List[Optional[str]]]] = {}
+
+    def _program(self, draft: Dict[str, Any]) -> Dict[str, Any]:
+        app_data = self.storage.get()
+        program = None
+        if draft["programId"] is not None:
+            program = get_program_by_id(app_data, draft["programId"], self.storage.registry)
+        if program is None:
+            program = self._programs_by_name.get(draft["programName"])
+        if program is None:
+            program = {
+                "id": self.storage.ids.next(),
+                "name": draft["programName"],
+                "progressionType": self.progression_type,
+                "exercises": [],
+            }
+            app_data.setdefault("programs", []).append(program)
+            self.storage.registry.add_program(program)
+            self._programs_by_name[program["name"]] = program
+            self.report.programs_created += 1
+        return program
+
+    def _exercise(self, program: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+        if entry["exerciseId"] is not None:
+            ref = self.storage.registry.exercise(entry["exerciseId"])
+            if ref is not None and ref[1] is program:
+                return ref[0]
+        exercise = next((ex for ex in program["exercises"] if ex.get("name") == entry["exerciseName"]), None)
+        if exercise is None:
+            exercise = {"id": self.storage.ids.next(), "name": entry["exerciseName"], "history": [], "nextTarget": None}
+            program["exercises"].append(exercise)
+            self.storage.registry.add_exercise(program, exercise)
+            self.report.exercises_created += 1
+        return exercise
+
+    def _is_duplicate(self, draft: Dict[str, Any], program: Dict[str, Any]) -> bool:
+        date = draft["date"]
+        key = (date, program["id"])
+        if key not in self._seen:
+            # [date, date + "\0") - ровно эта секунда
+            existing = sum(1 for s in self.storage.sessions_between(date, date + "\0") if s.get("programId") == program["id"])
+            self._seen[key] = (existing, [])
+        existing, source_ids = self._seen[key]
+        source_id = draft.get("sessionId")
+        if source_ids and (source_id is None or source_id in source_ids):
+            return True
+        source_ids.append(source_id)
+        # повторный импорт: первые тренировки этой секунды уже лежат в истории
+        return len(source_ids) <= existing
+
+    def build(self, draft: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        program = self._program(draft)
+        if self._is_duplicate(draft, program):
+            self.report.duplicates += 1
+            return None
+        session = {
+            "id": self.storage.ids.next(),
+            "date": draft["date"],
+            "programId": program["id"],
+            "programName": program["name"],
+            "exercises": [],
+        }
+        for entry in draft["exercises"]:
+            if not entry["sets"]:
+                continue
+            exercise = self._exercise(program, entry)
+            self.touched[exercise["id"]] = exercise
+            session["exercises"].append({
+                "exerciseId": exercise["id"],
+                "exerciseName": exercise["name"],
+                "sets": [{"id": self.storage.ids.next(), **s} for s in entry["sets"]],
+            })
+            self.report.sets += len(entry["sets"])
+        if not session["exercises"]:
+            return None
+        self.report.sessions += 1
+        return session
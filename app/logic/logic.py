@@ -2,17 +2,41 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
-
-from app.logic.models import get_active_program, get_program_by_id, find_exercise_by_id, get_last_workout_for_exercise as find_last_workout_in_history
+from datetime import date, datetime
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.logic.analytics import FORMULAS, exercise_analytics
+from app.logic.exporter import export_history, iter_sessions
+from app.logic.importer import ImportReport
+from app.logic.models import get_active_program, get_program_by_id, find_exercise_by_id
+from app.logic.plan import WorkoutPlan
+from app.logic.progression import progression_cache_info
 from app.logic.services import WorkoutService
+from app.logic.session_journal import SessionJournal
 from app.logic.session_state import SessionState
-from app.logic.storage import AppStorage
+from app.logic.storage import create_storage
+
+DateBound = Union[str, date, datetime, None]
+
+
+def _date_bound(value: DateBound) -> Optional[str]:
+    # даты в истории - строки "%Y-%m-%d %H:%M:%S", сравниваются лексикографически
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value.strftime("%Y-%m-%d")
 
 
 class ProgressiveOverloadLogic:
-    def __init__(self, data_file: str = "app_data.json") -> None:
-        self.storage = AppStorage(data_file)
+    def __init__(
+        self,
+        data_file: str = "app_data.json",
+        storage_backend: str = "json",
+        write_behind: bool = False,
+        session_journal: bool = False,
+    ) -> None:
+        self.storage = create_storage(data_file, storage_backend, write_behind)
         self.storage.load()
 
         app_data = self.storage.get()
@@ -20,24 +44,29 @@ class ProgressiveOverloadLogic:
             if app_data.get("programs") and not app_data.get("activeProgramId"):
                 app_data["activeProgramId"] = app_data["programs"][0]["id"]
 
-        self.session = SessionState()
+        # журнал незавершённой тренировки лежит рядом с файлом данных: app_data.json.session
+        journal = SessionJournal(data_file + ".session", before_reset=self.storage.flush) if session_journal else None
+        self.session = SessionState(journal, self.storage.ids)
         self.service = WorkoutService(self.storage, self.session)
 
-        self.service.init_current_workout()
+        self.service.restore_current_workout()
 
     # helpers
 
     def get_active_program(self) -> Optional[Dict[str, Any]]:
-        return get_active_program(self.storage.get())
+        return get_active_program(self.storage.get(), self.storage.registry)
 
     def get_program_by_id(self, program_id: int) -> Optional[Dict[str, Any]]:
-        return get_program_by_id(self.storage.get(), program_id)
+        return get_program_by_id(self.storage.get(), program_id, self.storage.registry)
 
     def find_exercise_by_id(self, exercise_id: int) -> Optional[Dict[str, Any]]:
-        return find_exercise_by_id(self.storage.get(), exercise_id)
+        return find_exercise_by_id(self.storage.get(), exercise_id, self.storage.registry)
     
     def get_last_workout_for_exercise(self, exercise_id: int) -> Optional[Dict[str, Any]]:
-        return find_last_workout_in_history(self.storage.get(), exercise_id)
+        return self.storage.last_workout_for_exercise(exercise_id)
+
+    def get_workouts_for_exercise(self, exercise_id: int) -> List[Dict[str, Any]]:
+        return self.storage.exercise_history(exercise_id)
 
     # CRUD
 
@@ -61,8 +90,8 @@ class ProgressiveOverloadLogic:
     def init_current_workout(self) -> None:
         self.service.init_current_workout()
 
-    def add_set_to_workout(self, exercise_id: int) -> None:
-        self.service.add_set_to_workout(exercise_id)
+    def add_set_to_workout(self, exercise_id: int) -> Dict[str, Any]:
+        return dict(self.service.add_set_to_workout(exercise_id))
 
     def delete_set_from_workout(self, exercise_id: int, set_id: int) -> None:
         self.service.delete_set_from_workout(exercise_id, set_id)
@@ -71,14 +100,30 @@ class ProgressiveOverloadLogic:
         self.service.update_set_in_workout(exercise_id, set_id, property_name, value)
     
     def get_current_workout_state(self):
-        state = self.service.session.current_workout_state
-        return {ex_id: list(sets) for ex_id, sets in state.items()}
+        return self.service.session.snapshot()
     
     def list_programs(self):
         return [dict(p) for p in self.storage.get().get("programs", [])]
     
     def list_workout_history(self):
-        return [dict(s) for s in self.storage.get().get("workoutHistory", [])]
+        return [dict(s) for s in self.storage.get_history()]
+
+    def iter_workout_history(self, newest_first: bool = True) -> Iterator[Dict[str, Any]]:
+        return self.storage.iter_history(newest_first)
+
+    def get_workout_history_page(self, page: int, page_size: int = 20) -> List[Dict[str, Any]]:
+        return [dict(s) for s in self.storage.history_page(page, page_size)]
+
+    def sessions_between(self, start: DateBound = None, end: DateBound = None) -> List[Dict[str, Any]]:
+        # [start, end) по возрастанию даты
+        return [dict(s) for s in self.storage.sessions_between(_date_bound(start), _date_bound(end))]
+
+    def exercise_history_since(self, exercise_id: int, since: DateBound) -> List[Dict[str, Any]]:
+        # записи упражнения {date, sets} начиная с since, а не целые тренировки
+        return self.storage.exercise_history(exercise_id, _date_bound(since))
+
+    # имя из исходной заявки: возвращает записи упражнения, а не тренировки, поэтому основное имя другое
+    sessions_for_exercise_since = exercise_history_since
 
     # validation support for ui
 
@@ -96,17 +141,69 @@ class ProgressiveOverloadLogic:
     def generate_workout_summary(self, saved_exercises_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         return self.service.generate_workout_summary(saved_exercises_data)
 
+    def get_workout_plan(self) -> Optional[WorkoutPlan]:
+        return self.service.get_workout_plan()
+
     # maintenance
 
+    def import_history(self, path: str, fmt: Optional[str] = None, strict: bool = True) -> ImportReport:
+        # fmt по расширению: .csv - строка на подход, иначе JSON/JSONL с сессиями
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "json")
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return self.service.import_history(f, fmt, strict)
+
+    def iter_export_sessions(
+        self,
+        program_ids: Optional[Collection[int]] = None,
+        exercise_ids: Optional[Collection[int]] = None,
+        start: DateBound = None,
+        end: DateBound = None,
+    ) -> Iterator[Dict[str, Any]]:
+        # сессии отдаются как есть, без копий: только для чтения
+        return iter_sessions(self.storage, program_ids, exercise_ids, _date_bound(start), _date_bound(end))
+
+    def export_history(
+        self,
+        path: str,
+        fmt: Optional[str] = None,
+        program_ids: Optional[Collection[int]] = None,
+        exercise_ids: Optional[Collection[int]] = None,
+        start: DateBound = None,
+        end: DateBound = None,
+    ) -> int:
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        sessions = self.iter_export_sessions(program_ids, exercise_ids, start, end)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            return export_history(f, fmt, sessions)
+
+    def replay_targets(
+        self, exercise_ids: Optional[List[int]] = None, full: bool = False, parallel: Optional[bool] = None
+    ) -> int:
+        # пересчитывает nextTarget по истории; возвращает число изменившихся целей
+        return self.service.replay_targets(exercise_ids, full, parallel)
+
     def delete_history_session(self, session_id: int) -> None:
         self.service.delete_history_session(session_id)
         
     def reset_all_data(self) -> None:
         self.service.reset_all_data()
 
+    def flush(self) -> None:
+        self.storage.flush()
+        if self.session.journal is not None:
+            self.session.journal.flush()
+
+    def get_progression_cache_info(self) -> Dict[str, Dict[str, int]]:
+        return progression_cache_info()
+
     # chart
 
     def get_progress_chart_data(self, exercise_id: int) -> Optional[Dict[str, List]]:
         return self.service.get_progress_chart_data(exercise_id)
 
+    def get_exercise_analytics(
+        self, exercise_ids: List[int], formulas: Tuple[str, ...] = FORMULAS, since: DateBound = None
+    ) -> Dict[int, Dict[str, Any]]:
+        return exercise_analytics(self.storage, exercise_ids, formulas, _date_bound(since))
+
     
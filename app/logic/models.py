@@ -1,33 +1,313 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 
-def get_active_program(app_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+@dataclass(frozen=True, slots=True)
+class SetRecord:
+    weight: float
+    reps: int
+    type: Optional[str] = "normal"
+    # вес или повторы не разобрались и заменены нулём
+    malformed: bool = False
+
+    @classmethod
+    def parse(cls, raw: Any) -> "SetRecord":
+        # вес/повторы в JSON бывают строками, float и int - приводим один раз
+        if isinstance(raw, SetRecord):
+            return raw
+        malformed = False
+        try:
+            weight = float(raw.get("weight", 0))
+        except (ValueError, TypeError):
+            weight, malformed = 0.0, True
+        try:
+            reps = int(float(raw.get("reps", 0)))
+        except (ValueError, TypeError):
+            reps, malformed = 0, True
+        return cls(weight, reps, raw.get("type"), malformed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, "weight": self.weight, "reps": self.reps}
+
+
+def parse_sets(sets: Iterable[Any]) -> Tuple[SetRecord, ...]:
+    return tuple(SetRecord.parse(s) for s in sets)
+
+
+def working_sets(sets: Iterable[Any]) -> List[SetRecord]:
+    return [s for s in map(SetRecord.parse, sets) if s.type == "normal"]
+
+
+@dataclass(slots=True)
+class ExerciseRecord:
+    # запись упражнения в сессии: ссылки на исходные dict-ы (для UI и хранилища);
+    # подходы разбираются при первом обращении, так что загрузка истории их не трогает
+    session: Dict[str, Any]
+    entry: Dict[str, Any]
+    _sets: Optional[Tuple[SetRecord, ...]] = None
+    _columns: Optional[Tuple[Tuple[float, ...], Tuple[int, ...]]] = None
+
+    @property
+    def sets(self) -> Tuple[SetRecord, ...]:
+        if self._sets is None:
+            self._sets = parse_sets(self.entry.get("sets", []))
+        return self._sets
+
+    @property
+    def columns(self) -> Tuple[Tuple[float, ...], Tuple[int, ...]]:
+        # веса и повторы рабочих подходов; как и sets, считаются один раз на запись
+        if self._columns is None:
+            working = self.working_sets
+            self._columns = (tuple(s.weight for s in working), tuple(s.reps for s in working))
+        return self._columns
+
+    @property
+    def date(self) -> str:
+        return self.session.get("date", "")
+
+    @property
+    def working_sets(self) -> List[SetRecord]:
+        return [s for s in self.sets if s.type == "normal"]
+
+
+ExerciseColumns = Tuple[List[str], List[int], List[float], List[int]]
+
+
+def record_columns(records: Sequence[ExerciseRecord]) -> ExerciseColumns:
+    # даты сессий, число рабочих подходов в каждой и плоские колонки весов/повторов;
+    # склейка идёт через chain, без прохода по подходам в Python
+    per_record = [r.columns for r in records]
+    return (
+        [r.date for r in records],
+        [len(weights) for weights, _ in per_record],
+        list(chain.from_iterable(weights for weights, _ in per_record)),
+        list(chain.from_iterable(reps for _, reps in per_record)),
+    )
+
+
+def sets_of(workout: Any) -> Sequence[Any]:
+    if workout is None:
+        return []
+    if isinstance(workout, ExerciseRecord):
+        return workout.sets
+    return workout.get("sets", [])
+
+
+class ProgramRegistry:
+    # id -> программы и id -> (упражнение, программа); при повторяющихся id, как и next(...), побеждает первое,
+    # а после его удаления - следующее с тем же id
+
+    def __init__(self, programs: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        self._programs: Dict[Any, List[Dict[str, Any]]] = {}
+        self._exercises: Dict[Any, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        if programs is not None:
+            self.rebuild(programs)
+
+    def rebuild(self, programs: Iterable[Dict[str, Any]]) -> None:
+        self._programs = {}
+        self._exercises = {}
+        for program in programs:
+            self.add_program(program)
+
+    def add_program(self, program: Dict[str, Any]) -> None:
+        self._programs.setdefault(program.get("id"), []).append(program)
+        for exercise in program.get("exercises", []):
+            self.add_exercise(program, exercise)
+
+    def remove_program(self, program: Dict[str, Any]) -> None:
+        refs = self._programs.get(program.get("id"), [])
+        refs[:] = [p for p in refs if p is not program]
+        if not refs:
+            self._programs.pop(program.get("id"), None)
+        for exercise in program.get("exercises", []):
+            self.remove_exercise(exercise)
+
+    def add_exercise(self, program: Dict[str, Any], exercise: Dict[str, Any]) -> None:
+        self._exercises.setdefault(exercise.get("id"), []).append((exercise, program))
+
+    def remove_exercise(self, exercise: Dict[str, Any]) -> None:
+        refs = self._exercises.get(exercise.get("id"), [])
+        refs[:] = [ref for ref in refs if ref[0] is not exercise]
+        if not refs:
+            self._exercises.pop(exercise.get("id"), None)
+
+    def program(self, program_id: Any) -> Optional[Dict[str, Any]]:
+        refs = self._programs.get(program_id)
+        return refs[0] if refs else None
+
+    def exercise(self, exercise_id: Any) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        refs = self._exercises.get(exercise_id)
+        return refs[0] if refs else None
+
+
+class IdAllocator:
+    # Монотонные id для программ, упражнений, подходов и тренировок. База - миллисекунды (как и раньше),
+    # но каждый новый id строго больше предыдущего, поэтому пачка созданий за одну мс не даёт дублей.
+    # Последний выданный id лежит в app_data["lastId"] и сохраняется вместе с данными.
+
+    def __init__(self, data: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+        own: Dict[str, Any] = {}
+        self._data = data or (lambda: own)
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            app_data = self._data()
+            value = max(int(time.time() * 1000), self._last(app_data) + 1)
+            app_data["lastId"] = value
+            return value
+
+    def observe(self, value: Any) -> None:
+        # id, выданный раньше и пришедший извне (журнал сессии, импорт): следующие будут больше
+        if not isinstance(value, int):
+            return
+        with self._lock:
+            app_data = self._data()
+            if value > self._last(app_data):
+                app_data["lastId"] = value
+
+    @staticmethod
+    def _last(app_data: Dict[str, Any]) -> int:
+        last = app_data.get("lastId")
+        if last is None:
+            # старый файл без lastId: хватает id программ и упражнений,
+            # id тренировок - прошлые миллисекунды и с новыми не пересекаются
+            ids = [0]
+            for program in app_data.get("programs", []):
+                ids.append(program.get("id"))
+                ids.extend(ex.get("id") for ex in program.get("exercises", []))
+            last = max(i for i in ids if isinstance(i, int))
+            app_data["lastId"] = last
+        return last
+
+
+def get_active_program(app_data: Dict[str, Any], registry: Optional[ProgramRegistry] = None) -> Optional[Dict[str, Any]]:
     active_id = app_data.get("activeProgramId")
     if not active_id:
         return None
+    if registry is not None:
+        return registry.program(active_id)
     return next((p for p in app_data.get("programs", []) if p.get("id") == active_id), None)
 
 
-def get_program_by_id(app_data: Dict[str, Any], program_id: int) -> Optional[Dict[str, Any]]:
+def get_program_by_id(app_data: Dict[str, Any], program_id: int, registry: Optional[ProgramRegistry] = None) -> Optional[Dict[str, Any]]:
+    if registry is not None:
+        return registry.program(program_id)
     return next((p for p in app_data.get("programs", []) if p.get("id") == program_id), None)
 
 
-def find_exercise_by_id(app_data: Dict[str, Any], exercise_id: int) -> Optional[Dict[str, Any]]:
+def find_exercise_by_id(app_data: Dict[str, Any], exercise_id: int, registry: Optional[ProgramRegistry] = None) -> Optional[Dict[str, Any]]:
+    if registry is not None:
+        ref = registry.exercise(exercise_id)
+        return {**ref[0], "programId": ref[1].get("id")} if ref else None
     for p in app_data.get("programs", []):
         for ex in p.get("exercises", []):
             if ex.get("id") == exercise_id:
                 return {**ex, "programId": p.get("id")}
     return None
 
-def get_last_workout_for_exercise(app_data: Dict[str, Any], exercise_id: int) -> Optional[Dict[str, Any]]:
-    workout_history = app_data.get("workoutHistory", [])
+def session_date(workout_session: Dict[str, Any]) -> str:
+    return workout_session.get("date", "")
+
+
+class HistoryTimeline:
+    # Список сессий, упорядоченный по дате (равные даты - в порядке добавления),
+    # и параллельный список дат для bisect. Сам список остаётся обычным list из app_data.
+
+    def __init__(self, sessions: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.rebuild(sessions if sessions is not None else [])
 
-    for workout_session in reversed(workout_history):
+    def rebuild(self, sessions: List[Dict[str, Any]]) -> None:
+        # сортируем на месте, только если порядок нарушен (старые файлы, ручные правки)
+        if any(session_date(a) > session_date(b) for a, b in zip(sessions, sessions[1:])):
+            sessions.sort(key=session_date)
+        self.sessions = sessions
+        self.dates = [session_date(s) for s in sessions]
+
+    def insert(self, workout_session: Dict[str, Any]) -> None:
+        date = session_date(workout_session)
+        i = bisect_right(self.dates, date)
+        self.dates.insert(i, date)
+        self.sessions.insert(i, workout_session)
+
+    def pop(self, session_id: Any) -> Optional[Dict[str, Any]]:
+        for i, workout_session in enumerate(self.sessions):
+            if workout_session.get("id") == session_id:
+                del self.dates[i]
+                return self.sessions.pop(i)
+        return None
+
+    def between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        # полуинтервал [start, end); None - без границы
+        lo = bisect_left(self.dates, start) if start is not None else 0
+        hi = bisect_left(self.dates, end) if end is not None else len(self.dates)
+        return self.sessions[lo:hi]
+
+
+class HistoryIndex:
+    # exerciseId -> [ExerciseRecord] по возрастанию даты; подходы разбираются при первом запросе записи
+
+    def __init__(self, history: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        self._by_exercise: Dict[Any, List[ExerciseRecord]] = {}
+        self._dates: Dict[Any, List[str]] = {}
+        if history is not None:
+            self.rebuild(history)
+
+    def rebuild(self, history: Iterable[Dict[str, Any]]) -> None:
+        self._by_exercise = {}
+        self._dates = {}
+        for workout_session in history:
+            self.add(workout_session)
+
+    def add(self, workout_session: Dict[str, Any]) -> None:
+        date = session_date(workout_session)
         for exercise_in_session in workout_session.get("exercises", []):
-            if exercise_in_session.get("exerciseId") == exercise_id:
-                return exercise_in_session
-    
-    return None
+            exercise_id = exercise_in_session.get("exerciseId")
+            refs = self._by_exercise.setdefault(exercise_id, [])
+            dates = self._dates.setdefault(exercise_id, [])
+            i = bisect_right(dates, date)
+            dates.insert(i, date)
+            refs.insert(i, ExerciseRecord(workout_session, exercise_in_session))
+
+    def remove(self, workout_session: Dict[str, Any]) -> None:
+        for exercise_id in {e.get("exerciseId") for e in workout_session.get("exercises", [])}:
+            refs = self._by_exercise.get(exercise_id, [])
+            refs[:] = [ref for ref in refs if ref.session is not workout_session]
+            if refs:
+                self._dates[exercise_id] = [ref.date for ref in refs]
+            else:
+                self._by_exercise.pop(exercise_id, None)
+                self._dates.pop(exercise_id, None)
+
+    def last_record(self, exercise_id: int) -> Optional[ExerciseRecord]:
+        refs = self._by_exercise.get(exercise_id)
+        if not refs:
+            return None
+        # если упражнение записано в сессии дважды, как и раньше возвращаем первую запись
+        i = len(refs) - 1
+        while i > 0 and refs[i - 1].session is refs[i].session:
+            i -= 1
+        return refs[i]
+
+    def last(self, exercise_id: int) -> Optional[Dict[str, Any]]:
+        record = self.last_record(exercise_id)
+        return record.entry if record is not None else None
+
+    def entries(self, exercise_id: int) -> List[ExerciseRecord]:
+        return self._by_exercise.get(exercise_id, [])
+
+    def since(self, exercise_id: int, date: str) -> List[ExerciseRecord]:
+        refs = self._by_exercise.get(exercise_id)
+        if not refs:
+            return []
+        return refs[bisect_left(self._dates[exercise_id], date):]
+
+    def exercise_ids(self) -> List[Any]:
+        return list(self._by_exercise)
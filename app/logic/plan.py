@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.logic.models import SetRecord, working_sets
+from app.logic.progression import calculate_next_target, check_goal_achievement
+
+
+def format_last_workout(last_workout: Optional[Dict[str, Any]]) -> str:
+    if not last_workout:
+        return "Это первая тренировка!"
+    sets_list = last_workout.get("sets", [])
+    if not sets_list:
+        return "Прошлая тренировка без рабочих подходов"
+    return "Прошлая: " + ", ".join([f"{s['reps']}x{s['weight']}кг" for s in sets_list])
+
+
+def format_target(next_target: Optional[Dict[str, Any]], has_last_workout: bool) -> str:
+    if not next_target:
+        return "Цель не рассчитана"
+    base_text = next_target.get("text", "")
+    if not has_last_workout:
+        return f"Цель: {base_text}"
+    w = next_target.get("weight", "")
+    w_text = f" с весом ~[b]{w} кг[/b]" if w else ""
+    return f"Цель: {base_text}{w_text}"
+
+
+@dataclass(slots=True)
+class ExerciseOutcome:
+    # результат новой тренировки относительно текущей цели; считается один раз для сводки и сохранения
+    had_target: bool
+    goal_achieved: bool
+    next_target: Optional[Dict[str, Any]]
+
+
+@dataclass(slots=True)
+class ExercisePlan:
+    exercise: Dict[str, Any]
+    progression_type: str
+    last_workout: Optional[Dict[str, Any]]
+    current_target: Dict[str, Any]
+    last_workout_text: str
+    target_text: str
+    _outcomes: Dict[Tuple[SetRecord, ...], ExerciseOutcome] = field(default_factory=dict)
+
+    def outcome(self, new_sets: List[Any]) -> Optional[ExerciseOutcome]:
+        new_working_sets = tuple(working_sets(new_sets))
+        if not new_working_sets:
+            return None
+        result = self._outcomes.get(new_working_sets)
+        if result is None:
+            exercise = self.exercise
+            if exercise.get("nextTarget") is None:
+                result = ExerciseOutcome(False, True, self._target_after(new_working_sets))
+            elif check_goal_achievement(exercise, list(new_working_sets), self.progression_type):
+                result = ExerciseOutcome(True, True, self._target_after(new_working_sets))
+            else:
+                result = ExerciseOutcome(True, False, None)
+            self._outcomes[new_working_sets] = result
+        return result
+
+    def _target_after(self, new_working_sets: Tuple[SetRecord, ...]) -> Dict[str, Any]:
+        return calculate_next_target(self.exercise, {"sets": new_working_sets}, self.progression_type)
+
+
+class WorkoutPlan:
+    # План тренировки по активной программе: прошлая тренировка, цель и готовые строки для экрана
+    # по каждому упражнению. Строится одним проходом и живёт, пока не изменились история или программы.
+
+    def __init__(self, program: Dict[str, Any], revision: int) -> None:
+        self.program = program
+        self.revision = revision
+        self.exercises: Dict[Any, ExercisePlan] = {}
+
+    @classmethod
+    def build(cls, program: Optional[Dict[str, Any]], storage: Any, revision: int) -> Optional["WorkoutPlan"]:
+        if not program:
+            return None
+        plan = cls(program, revision)
+        progression_type = program.get("progressionType", "double")
+        for ex in program.get("exercises", []):
+            if ex.get("id") in plan.exercises:
+                continue
+            last_workout = storage.last_workout_for_exercise(ex["id"])
+            current_target = calculate_next_target(ex, last_workout, progression_type)
+            plan.exercises[ex["id"]] = ExercisePlan(
+                exercise=ex,
+                progression_type=progression_type,
+                last_workout=last_workout,
+                current_target=current_target,
+                last_workout_text=format_last_workout(last_workout),
+                target_text=format_target(current_target, bool(last_workout)),
+            )
+        return plan
+
+    def get(self, exercise_id: Any) -> Optional[ExercisePlan]:
+        return self.exercises.get(exercise_id)
@@ -1,12 +1,95 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-from kivymd.app import MDApp
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.logic.models import SetRecord, sets_of, working_sets
+
+
+class LRUCache:
+    # Небольшой LRU для чистых функций прогрессии; счётчики hits/misses - для профилирования.
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+_MISSING = object()
+_next_target_cache = LRUCache()
+_goal_cache = LRUCache()
+
+
+def _sets_key(sets: List[SetRecord]) -> Tuple[Tuple[float, int], ...]:
+    return tuple((s.weight, s.reps) for s in sets)
+
+
+def _next_target_key(
+    exercise: Dict[str, Any], last_working_sets: List[SetRecord], progression_type: str
+) -> Optional[Hashable]:
+    # в ключ входит только то, от чего реально зависит результат
+    if not last_working_sets:
+        return (progression_type == "linear",)
+    if progression_type == "linear":
+        return ("linear", _sets_key(last_working_sets[:3]))
+    if progression_type != "double":
+        return None
+    current_target = exercise.get("nextTarget") or {}
+    if "weight" in current_target:
+        target = (current_target.get("weight", 0.0), current_target.get("reps", 8))
+        return ("double", target, _sets_key(last_working_sets[:3]))
+    # без цели стартовый вес подбирается по всем подходам
+    return ("double", None, _sets_key(last_working_sets))
 
 
 def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[str, Any]], progression_type: str) -> Dict[str, Any]:
-    last_working_sets = [s for s in last_workout.get("sets", []) if s.get("type") == "normal"] if last_workout else []
+    # last_workout - запись из истории (dict с "sets" или ExerciseRecord), подходы - dict или SetRecord
+    last_working_sets = working_sets(sets_of(last_workout))
+    key = _next_target_key(exercise, last_working_sets, progression_type)
+    try:
+        cached = _next_target_cache.get(key) if key is not None else _MISSING
+    except TypeError:
+        # нехешируемые значения в цели - считаем без кэша
+        key, cached = None, _MISSING
+    if cached is _MISSING:
+        cached = _calculate_next_target(exercise, last_working_sets, progression_type)
+        if key is not None:
+            _next_target_cache.put(key, cached)
+    # результат уходит в nextTarget программы, поэтому наружу всегда копия
+    return dict(cached) if cached is not None else None
+
+
+def _calculate_next_target(exercise: Dict[str, Any], last_working_sets: List[SetRecord], progression_type: str) -> Dict[str, Any]:
 
     if not last_working_sets:
         if progression_type == "linear":
@@ -48,17 +131,17 @@ def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[
         # Если нет хотя бы трех рабочих подходов, ориентируем на 3×12 без прибавки
         if len(first_three) < 3:
             # берём максимальный текущий вес как рабочий уровень
-            base_w = max(float(s.get("weight", 0.0)) for s in first_three) if first_three else 0.0
+            base_w = max(s.weight for s in first_three) if first_three else 0.0
             return {
                 "weight": base_w if base_w > 0 else None,
                 "sets": 3, "reps": 12,
                 "text": "3 подхода по 12 повторений"
             }
 
-        all_12 = all(int(float(s.get("reps", 0))) >= 12 for s in first_three)
+        all_12 = all(s.reps >= 12 for s in first_three)
 
         if all_12:
-            weights = [float(s.get("weight", 0.0)) for s in first_three]
+            weights = [s.weight for s in first_three]
             min_w, max_w = min(weights), max(weights)
             if abs(max_w - min_w) < 1e-9:
                 # Все три сета на одном весе: можно повышать
@@ -75,12 +158,12 @@ def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[
             # 3×12 не закрыты: если есть хотя бы один сет на 12 — целимся в 3×12 на максимальном весе,
             # где 12 было достигнуто; иначе — держим 3×12 на текущем рабочем уровне.
             weights_with_12 = [
-                float(s.get("weight", 0.0)) for s in first_three if int(float(s.get("reps", 0))) >= 12
+                s.weight for s in first_three if s.reps >= 12
             ]
             if weights_with_12:
                 target_w = max(weights_with_12)
             else:
-                target_w = max(float(s.get("weight", 0.0)) for s in first_three) if first_three else 0.0
+                target_w = max(s.weight for s in first_three) if first_three else 0.0
             return {
                 "weight": target_w if target_w > 0 else None,
                 "sets": 3, "reps": 12,
@@ -96,12 +179,12 @@ def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[
             current_weight = float(current_target.get("weight", 0.0))
             current_reps = int(current_target.get("reps", 8))
         else:
-            candidates_r8 = [float(s.get("weight", 0.0)) for s in last_working_sets if int(float(s.get("reps", 0))) >= 8]
+            candidates_r8 = [s.weight for s in last_working_sets if s.reps >= 8]
             if candidates_r8:
                 current_weight = max(candidates_r8)
             else:
-                max_reps = max(int(float(s.get("reps", 0))) for s in last_working_sets)
-                ties = [float(s.get("weight", 0.0)) for s in last_working_sets if int(float(s.get("reps", 0))) == max_reps]
+                max_reps = max(s.reps for s in last_working_sets)
+                ties = [s.weight for s in last_working_sets if s.reps == max_reps]
                 current_weight = min(ties) if ties else 20.0
             current_reps = 8
 
@@ -115,14 +198,14 @@ def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[
             return result
             
         achieved_current = all(
-            int(float(s.get("reps", 0))) >= current_reps and float(s.get("weight", 0.0)) >= current_weight
+            s.reps >= current_reps and s.weight >= current_weight
             for s in first_three
         )
 
         if not achieved_current:
             next_reps, next_weight = current_reps, current_weight
         else:
-            min_reps_achieved = min(int(float(s.get("reps", 0))) for s in first_three)
+            min_reps_achieved = min(s.reps for s in first_three)
 
             if min_reps_achieved >= 10:
                 next_weight = round((current_weight + weight_increment) * 4) / 4
@@ -141,6 +224,56 @@ def calculate_next_target(exercise: Dict[str, Any], last_workout: Optional[Dict[
 
 
 def check_goal_achievement(exercise: Dict[str, Any], new_working_sets: List[Dict[str, Any]], progression_type: str) -> bool:
+    target = exercise.get("nextTarget")
+    if not target:
+        return True
+
+    try:
+        sets = working_sets(new_working_sets)
+        if any(s.malformed for s in sets[:3]):
+            # как и до SetRecord: неразобранный вес/повторы не блокируют новую цель
+            return _check_goal_achievement(exercise, sets, progression_type)
+        key = (
+            progression_type == "linear",
+            target.get("weight", 0.0),
+            target.get("reps", 8) if progression_type != "linear" else None,
+            len(sets) >= 3,
+            _sets_key(sets[:3]),
+        )
+        cached = _goal_cache.get(key)
+    except (AttributeError, TypeError):
+        return _check_goal_achievement(exercise, new_working_sets, progression_type)
+    if cached is _MISSING:
+        cached = _check_goal_achievement(exercise, sets, progression_type)
+        _goal_cache.put(key, cached)
+    return cached
+
+
+def replay_next_target(
+    records: Iterable[Any], progression_type: str, target: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    # прогоняет тренировки упражнения по возрастанию даты так же, как save_workout:
+    # без цели или при выполненной цели - новая цель по этой тренировке, иначе цель остаётся
+    for record in records:
+        last_working_sets = working_sets(sets_of(record))
+        if not last_working_sets:
+            continue
+        exercise = {"nextTarget": target}
+        if target is None or check_goal_achievement(exercise, last_working_sets, progression_type):
+            target = calculate_next_target(exercise, {"sets": last_working_sets}, progression_type)
+    return target
+
+
+def progression_cache_info() -> Dict[str, Dict[str, int]]:
+    return {"next_target": _next_target_cache.info(), "goal": _goal_cache.info()}
+
+
+def clear_progression_cache() -> None:
+    _next_target_cache.clear()
+    _goal_cache.clear()
+
+
+def _check_goal_achievement(exercise: Dict[str, Any], new_working_sets: List[Any], progression_type: str) -> bool:
     if not exercise.get("nextTarget"):
         return True
 
@@ -152,30 +285,28 @@ def check_goal_achievement(exercise: Dict[str, Any], new_working_sets: List[Dict
         else:
             target_reps = int(target.get("reps", 8))
 
-        sets = [s for s in new_working_sets if s.get("type") == "normal"]
+        sets = working_sets(new_working_sets)
         if len(sets) < 3:
             return False
 
-        first_three = sets[:3]
-        return all(
-            int(float(s.get("reps", 0))) >= target_reps and float(s.get("weight", 0)) >= target_weight
-            for s in first_three
-        )
+        for s in sets[:3]:
+            if s.malformed:
+                return True
+            if s.reps < target_reps or s.weight < target_weight:
+                return False
+        return True
     except (ValueError, TypeError, KeyError):
         return True
 
 
-def calculate_one_rep_max(working_sets: List[Dict[str, Any]]) -> float:
+def calculate_one_rep_max(working_sets: List[Any]) -> float:
     if not working_sets:
         return 0.0
 
     max_orm = 0.0
-    for s in working_sets:
-        try:
-            weight = float(s.get("weight", 0))
-            reps = int(float(s.get("reps", 0)))
-        except (ValueError, TypeError):
-            continue
+    for s in map(SetRecord.parse, working_sets):
+        weight = s.weight
+        reps = s.reps
 
         if reps <= 0 or weight <= 0:
             orm = 0.0
@@ -188,4 +319,3 @@ def calculate_one_rep_max(working_sets: List[Dict[str, Any]]) -> float:
             max_orm = orm
 
     return max_orm
-
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Пересчёт nextTarget по истории: тренировки упражнения прогоняются по возрастанию даты
+# через те же правила, что и в save_workout (replay_next_target). Контрольная точка запоминается
+# каждые CHECKPOINT_EVERY тренировок и после последней, поэтому после правки истории пересчитывается
+# только хвост от ближайшей точки до даты правки. Точки сохраняются вместе с данными (app_data["replayCheckpoints"]),
+# так что и первая правка после запуска не прогоняет историю заново. Полный пересчёт многих упражнений (CLI)
+# раздаётся по процессам.
+
+from __future__ import annotations
+import os
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.logic.models import SetRecord
+from app.logic.progression import replay_next_target
+
+# (дата, id сессии, ((вес, повторы, тип, не разобран), ...)) - простые кортежи, чтобы дёшево передавать в процессы
+RecordRow = Tuple[str, Any, Tuple[Tuple[float, int, Optional[str], bool], ...]]
+
+
+@dataclass(frozen=True, slots=True)
+class Checkpoint:
+    # цель после тренировки date / session_id; index - номер тренировки в истории упражнения,
+    # same_date - сколько тренировок с этой датой уже учтено (включая эту)
+    date: str
+    session_id: Any
+    target: Optional[Dict[str, Any]]
+    index: int
+    same_date: int
+
+
+@dataclass(slots=True)
+class ReplayJob:
+    exercise_id: Any
+    progression_type: str
+    target: Optional[Dict[str, Any]]
+    records: List[RecordRow]
+
+
+def replay_rows(rows: Iterable[RecordRow], progression_type: str, target: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Any, Optional[Dict[str, Any]]]]:
+    result = []
+    for date, session_id, sets in rows:
+        target = replay_next_target([{"sets": [SetRecord(*s) for s in sets]}], progression_type, target)
+        result.append((date, session_id, target))
+    return result
+
+
+def _run_job(job: Tuple[Any, str, Optional[Dict[str, Any]], List[RecordRow]]) -> Tuple[Any, List[Tuple[str, Any, Optional[Dict[str, Any]]]]]:
+    # выполняется в дочернем процессе: только кортежи и dict-ы на входе и выходе
+    exercise_id, progression_type, target, rows = job
+    return exercise_id, replay_rows(rows, progression_type, target)
+
+
+class ReplayEngine:
+    # параллелить имеет смысл только на больших пересчётах: запуск процессов дороже сотни тренировок
+    PARALLEL_MIN_RECORDS = 5000
+    # точек на упражнение - около len(история) / CHECKPOINT_EVERY + 1
+    CHECKPOINT_EVERY = 32
+
+    def __init__(self, storage: Any, max_workers: Optional[int] = None) -> None:
+        self.storage = storage
+        self.max_workers = max_workers
+        self._checkpoints: Dict[Any, List[Checkpoint]] = {}
+        self._dates: Dict[Any, List[str]] = {}
+
+    def clear(self) -> None:
+        # только память: сохранённые точки уходят вместе с данными (reset_all_data заменяет app_data целиком)
+        self._checkpoints.clear()
+        self._dates.clear()
+
+    def checkpoints(self, exercise_id: Any) -> List[Checkpoint]:
+        return list(self._load(exercise_id) or [])
+
+    def has_checkpoints(self, exercise_id: Any) -> bool:
+        return bool(self._load(exercise_id))
+
+    def _load(self, exercise_id: Any) -> Optional[List[Checkpoint]]:
+        # точки упражнения поднимаются из app_data при первом обращении после запуска
+        checkpoints = self._checkpoints.get(exercise_id)
+        if checkpoints is None:
+            saved = (self.storage.get().get("replayCheckpoints") or {}).get(str(exercise_id))
+            if not saved:
+                return None
+            try:
+                checkpoints = [Checkpoint(*c) for c in saved]
+            except TypeError:
+                return None
+            self._checkpoints[exercise_id] = checkpoints
+            self._dates[exercise_id] = [c.date for c in checkpoints]
+        return checkpoints
+
+    def _store(self, exercise_id: Any) -> None:
+        # словарь заменяется целиком, а не правится: снимок для фоновой записи может ещё держать старый
+        app_data = self.storage.get()
+        saved = dict(app_data.get("replayCheckpoints") or {})
+        checkpoints = self._checkpoints.get(exercise_id)
+        if checkpoints:
+            saved[str(exercise_id)] = [[c.date, c.session_id, c.target, c.index, c.same_date] for c in checkpoints]
+        else:
+            saved.pop(str(exercise_id), None)
+        app_data["replayCheckpoints"] = saved
+
+    def invalidate(self, exercise_id: Any, since: Optional[str] = None) -> None:
+        # история упражнения изменилась начиная с since: точки с этой даты и позже больше не верны
+        if self._load(exercise_id) is None:
+            return
+        dates = self._dates[exercise_id]
+        i = 0 if since is None else bisect_left(dates, since)
+        if i == len(dates):
+            return
+        del dates[i:]
+        del self._checkpoints[exercise_id][i:]
+        self._store(exercise_id)
+
+    def invalidate_session(self, session: Dict[str, Any]) -> List[Any]:
+        exercise_ids = list(dict.fromkeys(entry.get("exerciseId") for entry in session.get("exercises", [])))
+        for exercise_id in exercise_ids:
+            self.invalidate(exercise_id, session.get("date"))
+        return exercise_ids
+
+    def _job(self, exercise_id: Any) -> ReplayJob:
+        ref = self.storage.registry.exercise(exercise_id)
+        progression_type = ref[1].get("progressionType", "double") if ref is not None else "double"
+        checkpoints = self._load(exercise_id)
+        if checkpoints:
+            # продолжаем с последней точки; тренировки той же секунды до неё включительно уже учтены
+            last = checkpoints[-1]
+            records = self.storage.exercise_records(exercise_id, since=last.date)
+            if len(records) >= last.same_date and records[last.same_date - 1].session.get("id") == last.session_id:
+                return ReplayJob(exercise_id, progression_type, last.target, [_row(r) for r in records[last.same_date:]])
+            # сохранённая точка не совпадает с историей (правка мимо приложения, смена хранилища) - с начала
+            self.invalidate(exercise_id)
+        return ReplayJob(exercise_id, progression_type, None, [_row(r) for r in self.storage.exercise_records(exercise_id)])
+
+    def replay(
+        self, exercise_ids: Iterable[Any], full: bool = False, parallel: Optional[bool] = None
+    ) -> Dict[Any, Optional[Dict[str, Any]]]:
+        # возвращает цель после последней тренировки каждого упражнения (None - истории нет)
+        exercise_ids = list(dict.fromkeys(exercise_ids))
+        if full:
+            for exercise_id in exercise_ids:
+                self.invalidate(exercise_id)
+        jobs = [self._job(exercise_id) for exercise_id in exercise_ids]
+
+        workers = self.max_workers or os.cpu_count() or 1
+        if parallel is None:
+            parallel = len(jobs) > 1 and workers > 1 and sum(len(j.records) for j in jobs) >= self.PARALLEL_MIN_RECORDS
+        results = self._run_parallel(jobs, workers) if parallel else None
+        if results is None:
+            results = [_run_job(_job_args(job)) for job in jobs]
+
+        for exercise_id, rows in results:
+            self._add_checkpoints(exercise_id, rows)
+        return {
+            exercise_id: (self._checkpoints[exercise_id][-1].target if self._checkpoints.get(exercise_id) else None)
+            for exercise_id in exercise_ids
+        }
+
+    def _add_checkpoints(self, exercise_id: Any, rows: List[Tuple[str, Any, Optional[Dict[str, Any]]]]) -> None:
+        if not rows:
+            return
+        checkpoints = self._checkpoints.setdefault(exercise_id, [])
+        dates = self._dates.setdefault(exercise_id, [])
+        prev = checkpoints[-1] if checkpoints else None
+        if prev is not None and (prev.index + 1) % self.CHECKPOINT_EVERY:
+            # точка после последней тренировки прошлого пересчёта больше не последняя
+            checkpoints.pop()
+            dates.pop()
+        index = prev.index if prev is not None else -1
+        same_date = prev.same_date if prev is not None else 0
+        prev_date = prev.date if prev is not None else None
+        last = len(rows) - 1
+        for i, (date, session_id, target) in enumerate(rows):
+            index += 1
+            same_date = same_date + 1 if date == prev_date else 1
+            prev_date = date
+            if (index + 1) % self.CHECKPOINT_EVERY == 0 or i == last:
+                checkpoints.append(Checkpoint(date, session_id, target, index, same_date))
+                dates.append(date)
+        self._store(exercise_id)
+
+    def _run_parallel(self, jobs: List[ReplayJob], workers: int) -> Optional[List[Any]]:
+        # самые длинные истории - первыми, чтобы процессы не простаивали в конце
+        ordered = sorted(jobs, key=lambda job: len(job.records), reverse=True)
+        try:
+            # пул процессов нужен только CLI: приложение его не импортирует, а без multiprocessing
+            # (например, Android) считаем в текущем процессе
+            from concurrent.futures import ProcessPoolExecutor
+            from concurrent.futures.process import BrokenProcessPool
+        except ImportError:
+            return None
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(ordered))) as pool:
+                return list(pool.map(_run_job, map(_job_args, ordered), chunksize=max(1, len(ordered) // (workers * 4))))
+        except (OSError, ImportError, NotImplementedError, BrokenProcessPool):
+            # процессы не запускаются - считаем в текущем
+            return None
+
+
+def _row(record: Any) -> RecordRow:
+    return record.date, record.session.get("id"), tuple((s.weight, s.reps, s.type, s.malformed) for s in record.sets)
+
+
+def _job_args(job: ReplayJob) -> Tuple[Any, str, Optional[Dict[str, Any]], List[RecordRow]]:
+    return job.exercise_id, job.progression_type, job.target, job.records
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import copy
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.logic.models import ExerciseRecord, HistoryIndex, HistoryTimeline
+from app.logic.storage import AppStorage, _write_json_atomic, detect_backend, load_app_data, sqlite_is_newer
+
+
+def _segment_key(session: Dict[str, Any]) -> str:
+    # "2025-03-14 18:20:00" -> "2025-03"
+    return str(session.get("date", ""))[:7] or "undated"
+
+
+class SegmentedAppStorage(AppStorage):
+    # В data_file лежат только программы и оглавление истории, сама история разбита по месяцам
+    # в каталоге <data_file>.history/ и подгружается посегментно, когда её кто-то запрашивает.
+
+    def __init__(self, data_file: str = "app_data.json", write_behind: bool = False) -> None:
+        super().__init__(data_file, write_behind)
+        self.history_dir = os.path.splitext(data_file)[0] + ".history"
+        self.app_data.pop("workoutHistory")
+        self.app_data["historySegments"] = {}
+        self.app_data["exerciseSegments"] = {}
+        # база sqlite новее data_file - загрузка переливает историю из неё
+        self.follow_sqlite = True
+        self._segments: Dict[str, List[Dict[str, Any]]] = {}
+        self._timelines: Dict[str, HistoryTimeline] = {}
+        self._indexes: Dict[str, HistoryIndex] = {}
+        self._dirty: set = set()
+        # _dirty подменяет основной поток в _snapshot, а поток записи возвращает в него сегменты при ошибке
+        self._dirty_lock = threading.Lock()
+
+    # оглавление
+
+    def _segment_keys(self, newest_first: bool = False) -> List[str]:
+        return sorted(self.app_data["historySegments"], reverse=newest_first)
+
+    def _segment_path(self, key: str) -> str:
+        return os.path.join(self.history_dir, f"{key}.json")
+
+    def _segment(self, key: str) -> List[Dict[str, Any]]:
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = self._read_segment(key)
+            self._open_segment(key, segment)
+        return segment
+
+    def _read_segment(self, key: str) -> List[Dict[str, Any]]:
+        try:
+            with open(self._segment_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _open_segment(self, key: str, segment: List[Dict[str, Any]]) -> None:
+        self._timelines[key] = HistoryTimeline(segment)
+        self._segments[key] = segment
+        self._indexes[key] = HistoryIndex(segment)
+
+    def _segment_index(self, key: str) -> HistoryIndex:
+        self._segment(key)
+        return self._indexes[key]
+
+    def _index_session(self, key: str, session: Dict[str, Any]) -> None:
+        segments = self.app_data["historySegments"]
+        segments[key] = segments.get(key, 0) + 1
+        exercise_segments = self.app_data["exerciseSegments"]
+        for entry in session.get("exercises", []):
+            keys = exercise_segments.setdefault(str(entry.get("exerciseId")), [])
+            if key not in keys:
+                keys.append(key)
+                keys.sort()
+
+    # загрузка
+
+    def load(self) -> None:
+        try:
+            with open(self.data_file, "r", encoding="utf-8") as f:
+                saved_data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved_data = {}
+
+        if "historySegments" in saved_data and not (self.follow_sqlite and sqlite_is_newer(self.data_file)):
+            self.app_data.update(saved_data)
+        else:
+            # json/journal в самом data_file или база sqlite рядом с ним (в том числе записанная
+            # через CLI уже после перехода на сегменты)
+            source = detect_backend(self.data_file)
+            if source is not None:
+                # сегменты старого оглавления перезапишутся новыми или удалятся
+                self._mark_dirty(saved_data.get("historySegments", {}))
+                self._migrate(source)
+        self.registry.rebuild(self.app_data.get("programs", []))
+
+    def _migrate(self, source: str) -> None:
+        legacy_data = load_app_data(self.data_file, source)
+
+        self.app_data.update({k: v for k, v in legacy_data.items() if k != "workoutHistory"})
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for session in legacy_data.get("workoutHistory", []):
+            key = _segment_key(session)
+            by_key.setdefault(key, []).append(session)
+            self._index_session(key, session)
+        for key, segment in by_key.items():
+            self._open_segment(key, segment)
+        self._mark_dirty(self._segments)
+
+        try:
+            self._write(self._snapshot(detached=False))
+            if source == "journal":
+                os.remove(self.data_file + ".journal")
+        except OSError:
+            pass
+
+    # запись
+
+    def _snapshot(self, detached: bool) -> Any:
+        with self._dirty_lock:
+            dirty_keys, self._dirty = self._dirty, set()
+        dirty = {key: self._segments.get(key, []) for key in dirty_keys}
+        meta = self.app_data
+        if detached:
+            meta = copy.deepcopy(meta)
+            dirty = {key: list(segment) for key, segment in dirty.items()}
+        return {"meta": meta, "segments": dirty}
+
+    def _write_failed(self, snapshot: Any) -> None:
+        # сегменты снимка снова грязные: следующий save() запишет их текущее содержимое
+        self._mark_dirty(snapshot["segments"])
+
+    def _mark_dirty(self, keys: Any) -> None:
+        with self._dirty_lock:
+            self._dirty.update(keys)
+
+    def _write(self, snapshot: Any) -> None:
+        if snapshot["segments"]:
+            os.makedirs(self.history_dir, exist_ok=True)
+        for key, segment in snapshot["segments"].items():
+            path = self._segment_path(key)
+            if segment:
+                _write_json_atomic(path, segment)
+            elif os.path.exists(path):
+                os.remove(path)
+        _write_json_atomic(self.data_file, snapshot["meta"], indent=4)
+
+    def _merge_snapshots(self, older: Any, newer: Any) -> Optional[Any]:
+        return {"meta": newer["meta"], "segments": {**older["segments"], **newer["segments"]}}
+
+    def set(self, new_data: Dict[str, Any]) -> None:
+        new_data = dict(new_data)
+        history = new_data.pop("workoutHistory", None)
+        new_data.setdefault("historySegments", {})
+        new_data.setdefault("exerciseSegments", {})
+        if history is None:
+            self.app_data = new_data
+            self.registry.rebuild(self.app_data.get("programs", []))
+            return
+
+        self._mark_dirty(self.app_data["historySegments"])
+        with self._dirty_lock:
+            stale = list(self._dirty)
+        self._segments, self._timelines, self._indexes = {}, {}, {}
+        for key in stale:
+            self._open_segment(key, [])
+        new_data["historySegments"] = {}
+        new_data["exerciseSegments"] = {}
+        self.app_data = new_data
+        self.registry.rebuild(self.app_data.get("programs", []))
+        for session in history:
+            self.append_history(session)
+
+    # history queries
+
+    def get_history(self) -> List[Dict[str, Any]]:
+        return list(self.iter_history())
+
+    def iter_history(self, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        for key in self._segment_keys(newest_first):
+            segment = self._segment(key)
+            yield from (reversed(segment) if newest_first else segment)
+
+    def sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        # сегменты - месяцы, поэтому лишние отсекаются по первым 7 символам даты
+        sessions: List[Dict[str, Any]] = []
+        for key in self._segment_keys():
+            if (start is not None and key < start[:7]) or (end is not None and key > end[:7]):
+                continue
+            self._segment(key)
+            sessions.extend(self._timelines[key].between(start, end))
+        return sessions
+
+    def iter_sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        # для выгрузки: незагруженные сегменты читаются по одному и не кэшируются,
+        # так что в памяти держится не больше месяца истории сверх уже открытого
+        for key in self._segment_keys():
+            if (start is not None and key < start[:7]) or (end is not None and key > end[:7]):
+                continue
+            timeline = self._timelines.get(key)
+            if timeline is None:
+                timeline = HistoryTimeline(self._read_segment(key))
+            yield from timeline.between(start, end)
+
+    def last_exercise_record(self, exercise_id: int) -> Optional[ExerciseRecord]:
+        for key in reversed(self.app_data["exerciseSegments"].get(str(exercise_id), [])):
+            record = self._segment_index(key).last_record(exercise_id)
+            if record is not None:
+                return record
+        return None
+
+    def exercise_records(self, exercise_id: int, since: Optional[str] = None) -> List[ExerciseRecord]:
+        records: List[ExerciseRecord] = []
+        for key in self.app_data["exerciseSegments"].get(str(exercise_id), []):
+            if since is None:
+                records.extend(self._segment_index(key).entries(exercise_id))
+            elif key >= since[:7]:
+                records.extend(self._segment_index(key).since(exercise_id, since))
+        return records
+
+    # history mutations
+
+    def append_history(self, session: Dict[str, Any]) -> None:
+        key = _segment_key(session)
+        self._segment(key)
+        self._timelines[key].insert(session)
+        self._indexes[key].add(session)
+        self._index_session(key, session)
+        self._mark_dirty((key,))
+
+    def extend_history(self, sessions: List[Dict[str, Any]]) -> None:
+        # сегменты и так пишутся целиком при следующем save()
+        for session in sessions:
+            self.append_history(session)
+
+    def remove_history(self, session_id: int) -> Optional[Dict[str, Any]]:
+        # сначала уже загруженные сегменты (удаляют обычно с экрана истории), потом остальные
+        loaded = [key for key in self._segment_keys(newest_first=True) if key in self._segments]
+        rest = [key for key in self._segment_keys(newest_first=True) if key not in self._segments]
+        for key in loaded + rest:
+            self._segment(key)
+            session = self._timelines[key].pop(session_id)
+            if session is not None:
+                self._indexes[key].remove(session)
+                self._unindex_session(key, session)
+                self._mark_dirty((key,))
+                return session
+        return None
+
+    def _unindex_session(self, key: str, session: Dict[str, Any]) -> None:
+        segments = self.app_data["historySegments"]
+        segments[key] -= 1
+        if segments[key] <= 0:
+            del segments[key]
+
+        index = self._indexes[key]
+        exercise_segments = self.app_data["exerciseSegments"]
+        for entry in session.get("exercises", []):
+            exercise_id = entry.get("exerciseId")
+            keys = exercise_segments.get(str(exercise_id), [])
+            if not index.entries(exercise_id) and key in keys:
+                keys.remove(key)
+                if not keys:
+                    del exercise_segments[str(exercise_id)]
@@ -1,32 +1,58 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
-from app.logic.models import get_active_program, get_program_by_id
-from app.logic.progression import calculate_next_target, check_goal_achievement, calculate_one_rep_max
+from typing import IO, Any, Dict, List, Optional
+from app.logic.analytics import column_stats
+from app.logic.importer import ImportReport, ImportValidationError, SessionBuilder, read_sessions
+from app.logic.models import get_active_program, get_program_by_id, working_sets
+from app.logic.plan import WorkoutPlan
+from app.logic.progression import calculate_next_target, calculate_one_rep_max
+from app.logic.replay import ReplayEngine
 from app.logic.session_state import SessionState
 from app.logic.storage import AppStorage
 
 
+def _session_one_rep_max(sets: List[Any]) -> float:
+    return calculate_one_rep_max(working_sets(sets))
+
+
 class WorkoutService:
+    CHART_CACHE_SIZE = 16
+
     def __init__(self, storage: AppStorage, session: SessionState) -> None:
         self.storage = storage
         self.session = session
-
+        # exerciseId -> {"labels": [...], "data": [...]} для графиков 1ПМ, вытесняется по LRU
+        self._chart_cache: "OrderedDict[int, Dict[str, List]]" = OrderedDict()
+        # план тренировки перестраивается, когда меняется revision (история или программы)
+        self._revision = 0
+        self._plan: Optional[WorkoutPlan] = None
+        # контрольные точки целей по истории: правка истории пересчитывает только хвост
+        self.replay = ReplayEngine(storage)
+
+    def _program_exercise(self, program: Dict[str, Any], exercise_id: int) -> Optional[Dict[str, Any]]:
+        ref = self.storage.registry.exercise(exercise_id)
+        if ref is not None and ref[1] is program:
+            return ref[0]
+        # повторяющийся id: зарегистрировано упражнение из другой программы
+        return next((ex for ex in program["exercises"] if ex.get("id") == exercise_id), None)
 
     def create_new_program(self, name: str, progression_type: str) -> None:
         app_data = self.storage.get()
         new_program = {
-            "id": int(time.time() * 1000),
+            "id": self.storage.ids.next(),
             "name": name,
             "progressionType": progression_type,
             "exercises": [],
         }
         if len(name) <= 30:
             app_data["programs"].append(new_program)
+            self.storage.registry.add_program(new_program)
             app_data["activeProgramId"] = new_program["id"]
+            self._invalidate_plan()
             self.storage.save()
             self.session.init_for_program(new_program)
 
@@ -34,52 +60,68 @@ class WorkoutService:
         app_data = self.storage.get()
         # if len(app_data.get("programs", [])) <= 1:
         #     return False
+        removed = [p for p in app_data["programs"] if p.get("id") == program_id]
         app_data["programs"] = [p for p in app_data["programs"] if p.get("id") != program_id]
+        for program in removed:
+            self.storage.registry.remove_program(program)
         if app_data.get("activeProgramId") == program_id:
             app_data["activeProgramId"] = app_data["programs"][0]["id"] if app_data["programs"] else None
+        self._invalidate_plan()
         self.storage.save()
-        self.session.init_for_program(get_active_program(app_data))
+        if app_data.get("activeProgramId") != self.session.program_id:
+            self.session.init_for_program(get_active_program(app_data, self.storage.registry))
         return True
 
     def select_program(self, program_id: int) -> None:
         app_data = self.storage.get()
         app_data["activeProgramId"] = program_id
-        self.session.init_for_program(get_active_program(app_data))
+        self._invalidate_plan()
+        # повторный выбор активной программы не сбрасывает начатую тренировку
+        if program_id != self.session.program_id:
+            self.session.init_for_program(get_active_program(app_data, self.storage.registry))
         self.storage.save()
 
     def add_exercise_to_active_program(self, name: str) -> None:
         app_data = self.storage.get()
-        active_program = get_active_program(app_data)
+        active_program = get_active_program(app_data, self.storage.registry)
         if not active_program:
             return
         new_exercise = {
-            "id": int(time.time() * 1000),
+            "id": self.storage.ids.next(),
             "name": name,
             "history": [],
             "nextTarget": None,
         }
         active_program["exercises"].append(new_exercise)
-        if new_exercise["id"] not in self.session.current_workout_state:
-            self.session.current_workout_state[new_exercise["id"]] = []
+        self.storage.registry.add_exercise(active_program, new_exercise)
+        self._invalidate_plan()
+        self.session.add_exercise(new_exercise["id"])
         self.storage.save()
 
     def delete_exercise_from_active(self, exercise_id: int) -> None:
         app_data = self.storage.get()
-        active_program = get_active_program(app_data)
+        active_program = get_active_program(app_data, self.storage.registry)
         if not active_program:
             return
+        for ex in active_program["exercises"]:
+            if ex.get("id") == exercise_id:
+                self.storage.registry.remove_exercise(ex)
         active_program["exercises"] = [ex for ex in active_program["exercises"] if ex.get("id") != exercise_id]
-        if exercise_id in self.session.current_workout_state:
-            del self.session.current_workout_state[exercise_id]
+        self._invalidate_plan()
+        self.session.remove_exercise(exercise_id)
         self.storage.save()
 
 
     def init_current_workout(self) -> None:
         app_data = self.storage.get()
-        self.session.init_for_program(get_active_program(app_data))
+        self.session.init_for_program(get_active_program(app_data, self.storage.registry))
+
+    def restore_current_workout(self) -> bool:
+        app_data = self.storage.get()
+        return self.session.restore(get_active_program(app_data, self.storage.registry))
 
-    def add_set_to_workout(self, exercise_id: int) -> None:
-        self.session.add_set(exercise_id)
+    def add_set_to_workout(self, exercise_id: int) -> Dict[str, Any]:
+        return self.session.add_set(exercise_id)
 
     def delete_set_from_workout(self, exercise_id: int, set_id: int) -> None:
         self.session.delete_set(exercise_id, set_id)
@@ -94,40 +136,43 @@ class WorkoutService:
         return self.session.has_validation_errors()
 
 
+    def _invalidate_plan(self) -> None:
+        self._revision += 1
+
+    def get_workout_plan(self) -> Optional[WorkoutPlan]:
+        active_program = get_active_program(self.storage.get(), self.storage.registry)
+        plan = self._plan
+        if plan is None or plan.revision != self._revision or plan.program is not active_program:
+            plan = self._plan = WorkoutPlan.build(active_program, self.storage, self._revision)
+        return plan
+
+    def _exercise_plan(self, program: Dict[str, Any], exercise_id: int):
+        # план есть только для активной программы
+        plan = self.get_workout_plan()
+        if plan is None or plan.program is not program:
+            return None
+        return plan.get(exercise_id)
+
     def save_workout(self, saved_exercises_data: List[Dict[str, Any]]) -> None:
         app_data = self.storage.get()
-        active_program = get_active_program(app_data)
+        active_program = get_active_program(app_data, self.storage.registry)
         if not active_program:
             return
 
+        # цели считаются по одному состоянию программы, поэтому сначала собираем исходы, потом применяем
+        updates = []
         for item in saved_exercises_data:
-            exercise_data = item["exercise"]
-            new_sets = item["newSets"]
-            new_working_sets = [s for s in new_sets if s.get("type") == "normal"]
-            if not new_working_sets:
+            exercise_plan = self._exercise_plan(active_program, item["exercise"].get("id"))
+            if exercise_plan is None:
                 continue
-
-            program_exercise = next(
-                (ex for ex in active_program["exercises"] if ex.get("id") == exercise_data.get("id")), None
-            )
-            if not program_exercise:
-                continue
-
-            progression_type = active_program.get("progressionType", "double")
-            has_target = program_exercise.get("nextTarget") is not None
-
-            if not has_target:
-                program_exercise["nextTarget"] = calculate_next_target(
-                    program_exercise, {"sets": new_working_sets}, progression_type
-                )
-            else:
-                if check_goal_achievement(program_exercise, new_working_sets, progression_type):
-                    program_exercise["nextTarget"] = calculate_next_target(
-                        program_exercise, {"sets": new_working_sets}, progression_type
-                    )
+            outcome = exercise_plan.outcome(item["newSets"])
+            if outcome is not None and outcome.goal_achieved:
+                updates.append((exercise_plan.exercise, outcome.next_target))
+        for program_exercise, next_target in updates:
+            program_exercise["nextTarget"] = dict(next_target)
 
         workout_entry = {
-            "id": int(time.time() * 1000),
+            "id": self.storage.ids.next(),
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "programId": active_program["id"],
             "programName": active_program["name"],
@@ -140,9 +185,13 @@ class WorkoutService:
                 "sets": item["newSets"],
             })
 
-        app_data["workoutHistory"].append(workout_entry)
-        self.init_current_workout()
+        self.storage.append_history(workout_entry)
+        self.replay.invalidate_session(workout_entry)
+        self._add_chart_points(workout_entry)
+        self._invalidate_plan()
+        # сначала сохранение, потом сброс тренировки: журнал сессии затирается только после записи истории
         self.storage.save()
+        self.init_current_workout()
 
     def generate_workout_summary(self, saved_exercises_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         app_data = self.storage.get()
@@ -151,129 +200,182 @@ class WorkoutService:
 
         for item in saved_exercises_data:
             exercise_data = item["exercise"]
-            new_sets = item["newSets"]
-            new_working_sets = [s for s in new_sets if s.get("type") == "normal"]
-            if not new_working_sets:
-                continue
 
-            active_program = get_program_by_id(app_data, exercise_data["programId"])
+            active_program = get_program_by_id(app_data, exercise_data["programId"], self.storage.registry)
             if not active_program:
                 continue
 
-            program_exercise = next(
-                (ex for ex in active_program["exercises"] if ex.get("id") == exercise_data.get("id")), None
-            )
-            if not program_exercise:
+            exercise_plan = self._exercise_plan(active_program, exercise_data.get("id"))
+            if exercise_plan is None:
+                program_exercise = self._program_exercise(active_program, exercise_data.get("id"))
+                if not program_exercise:
+                    continue
+                # упражнение не из активной программы - считаем без кэша
+                exercise_plan = WorkoutPlan.build(
+                    {**active_program, "exercises": [program_exercise]}, self.storage, self._revision
+                ).get(program_exercise.get("id"))
+
+            outcome = exercise_plan.outcome(item["newSets"])
+            if outcome is None:
                 continue
 
-            progression_type = active_program.get("progressionType", "double")
-            has_target = program_exercise.get("nextTarget") is not None
-
-            detail = {"exercise_name": program_exercise["name"]}
-            if not has_target:
+            detail = {"exercise_name": exercise_plan.exercise["name"]}
+            if not outcome.had_target:
                 detail["status"] = "success"
                 detail["message"] = "Отличное начало! "
-                potential = calculate_next_target(program_exercise, {"sets": new_working_sets}, progression_type)
+                potential = outcome.next_target
                 detail["next_target_text"] = (
-                    # f"Цель на следующую тренировку: {potential['text']}"
-                    # f"{f' с весом {potential['weight']} кг' if 'weight' in potential else ''}"
                     f"Цель на следующую тренировку: {potential['text']}"
                     + (f" с весом {potential['weight']} кг" if "weight" in potential else "")
                 )
+            elif outcome.goal_achieved:
+                detail["status"] = "success"
+                detail["message"] = "Цель достигнута! "
+                potential = outcome.next_target
+                detail["next_target_text"] = (
+                    f"Следующая цель: {potential['text']}"
+                    + (f" с весом {potential['weight']} кг" if "weight" in potential else "")
+                )
             else:
-                is_goal = check_goal_achievement(program_exercise, new_working_sets, progression_type)
-                if is_goal:
-                    detail["status"] = "success"
-                    detail["message"] = "Цель достигнута! "
-                    potential = calculate_next_target(program_exercise, {"sets": new_working_sets}, progression_type)
-                    detail["next_target_text"] = (
-                        # f"Следующая цель: {potential['text']}"
-                        # f"{f' с весом {potential['weight']} кг' if 'weight' in potential else ''}"
-                        f"Следующая цель: {potential['text']}"
-                        + (f" с весом {potential['weight']} кг" if "weight" in potential else "")
-                    )
-                else:
-                    all_goals_achieved = False
-                    detail["status"] = "failure"
-                    detail["message"] = "Цель не достигнута. "
-                    nt = program_exercise["nextTarget"]
-                    detail["next_target_text"] = (
-                        # f"Повторите: {nt['text']}"
-                        # f"{f' с весом {nt['weight']} кг' if 'weight' in nt else ''}"
-                        f"Повторите: {nt['text']}"
-                        + (f" с весом {nt['weight']} кг" if "weight" in nt else "")
-                    )
+                all_goals_achieved = False
+                detail["status"] = "failure"
+                detail["message"] = "Цель не достигнута. "
+                nt = exercise_plan.exercise["nextTarget"]
+                detail["next_target_text"] = (
+                    f"Повторите: {nt['text']}"
+                    + (f" с весом {nt['weight']} кг" if "weight" in nt else "")
+                )
 
             summary_details.append(detail)
 
         return {"all_goals_achieved": all_goals_achieved, "details": summary_details}
 
     def delete_history_session(self, session_id: int) -> None:
-        app_data = self.storage.get()
-
-        history = app_data.get("workoutHistory", [])
-        session_to_delete = next((s for s in history if s.get("id") == session_id), None)
+        session_to_delete = self.storage.remove_history(session_id)
         if not session_to_delete:
             return
+        self._remove_chart_points(session_to_delete)
 
-        app_data["workoutHistory"] = [s for s in history if s.get("id") != session_id]
-
-        active_program = get_active_program(app_data)
-        if active_program:
-            progression_type = active_program.get("progressionType", "double")
-            history_after = app_data.get("workoutHistory", [])
-
-            for prog_ex in active_program.get("exercises", []):
-                ex_id = prog_ex.get("id")
-
-                last_workout_for_ex = None
-                for workout_session in reversed(history_after):
-                    for ex_entry in workout_session.get("exercises", []):
-                        if ex_entry.get("exerciseId") == ex_id:
-                            working_sets = [s for s in ex_entry.get("sets", []) if s.get("type") == "normal"]
-                            last_workout_for_ex = {"sets": working_sets}
-                            break
-                    if last_workout_for_ex is not None:
-                        break
-
-                prev_target = prog_ex.get("nextTarget")
-                prog_ex["nextTarget"] = None
-
-                new_target = calculate_next_target(
-                    prog_ex,
-                    last_workout_for_ex,
-                    progression_type
+        # цели пересчитываются только для упражнений из удалённой сессии, в какой бы программе они ни были,
+        # и только начиная с даты удалённой тренировки
+        exercise_ids = [
+            ex_id for ex_id in dict.fromkeys(e.get("exerciseId") for e in session_to_delete.get("exercises", []))
+            if self.storage.registry.exercise(ex_id) is not None
+        ]
+        # без контрольных точек (история ещё ни разу не прогонялась) полный replay на потоке UI не запускаем
+        replayable = [ex_id for ex_id in exercise_ids if self.replay.has_checkpoints(ex_id)]
+        self.replay.invalidate_session(session_to_delete)
+        targets = self.replay.replay(replayable, parallel=False)
+        for ex_id in exercise_ids:
+            if ex_id not in targets:
+                # как раньше: цель заново по последней оставшейся тренировке
+                program_exercise, program = self.storage.registry.exercise(ex_id)
+                targets[ex_id] = calculate_next_target(
+                    {**program_exercise, "nextTarget": None},
+                    self.storage.last_workout_for_exercise(ex_id),
+                    program.get("progressionType", "double"),
                 )
+        self._apply_targets(targets)
 
-                prog_ex["nextTarget"] = new_target
-
+        self._invalidate_plan()
         self.storage.save()
-        print("цель обновлена, теперь: ", prog_ex["nextTarget"])
 
+    def import_history(self, f: IO[str], fmt: str, strict: bool = True) -> ImportReport:
+        report = ImportReport()
+        drafts = read_sessions(f, fmt, report.errors)
+        if strict:
+            # всё или ничего: до первой записи файл должен быть прочитан без ошибок
+            drafts = list(drafts)
+            if report.errors:
+                raise ImportValidationError(report.errors)
 
+        builder = SessionBuilder(self.storage, report)
+        sessions = [session for session in map(builder.build, drafts) if session is not None]
+        if not sessions and not report.programs_created:
+            return report
 
+        app_data = self.storage.get()
+        self.storage.extend_history(sessions)
+        if not app_data.get("activeProgramId") and app_data.get("programs"):
+            app_data["activeProgramId"] = app_data["programs"][0]["id"]
+            self.init_current_workout()
+
+        # цели затронутых упражнений - по их истории с даты самой ранней импортированной тренировки
+        for session in sessions:
+            self.replay.invalidate_session(session)
+        # без процессов: из приложения (Kivy, несколько потоков) fork делать нельзя, пул - только для CLI replay
+        report.targets_updated = self._apply_targets(self.replay.replay(builder.touched, parallel=False))
+
+        self.invalidate_chart_cache()
+        self._invalidate_plan()
+        self.storage.save()
+        return report
+
+    def _apply_targets(self, targets: Dict[Any, Optional[Dict[str, Any]]]) -> int:
+        changed = 0
+        for exercise_id, next_target in targets.items():
+            ref = self.storage.registry.exercise(exercise_id)
+            if ref is None or ref[0].get("nextTarget") == next_target:
+                continue
+            ref[0]["nextTarget"] = dict(next_target) if next_target is not None else None
+            changed += 1
+        return changed
+
+    def replay_targets(self, exercise_ids: Optional[List[int]] = None, full: bool = False, parallel: Optional[bool] = None) -> int:
+        # full - без контрольных точек, с первой тренировки (например, после смены правил прогрессии)
+        if exercise_ids is None:
+            exercise_ids = [ex["id"] for p in self.storage.get().get("programs", []) for ex in p.get("exercises", [])]
+        changed = self._apply_targets(self.replay.replay(exercise_ids, full=full, parallel=parallel))
+        if changed:
+            self._invalidate_plan()
+        # контрольные точки сохраняются, даже если цели не изменились
+        self.storage.save()
+        return changed
 
     def get_progress_chart_data(self, exercise_id: int) -> Optional[Dict[str, List]]:
-        app_data = self.storage.get()
-        history_for_exercise: List[Dict[str, Any]] = []
-        for workout_session in app_data.get("workoutHistory", []):
-            for exercise_entry in workout_session.get("exercises", []):
-                if exercise_entry.get("exerciseId") == exercise_id:
-                    history_for_exercise.append({
-                        "date": workout_session["date"],
-                        "sets": exercise_entry["sets"],
-                    })
-        if not history_for_exercise:
+        series = self._chart_cache.get(exercise_id)
+        if series is None:
+            stats = column_stats(self.storage.exercise_columns(exercise_id))
+            series = {"labels": stats["labels"], "data": stats["one_rep_max"]["epley"]}
+            self._chart_cache[exercise_id] = series
+            if len(self._chart_cache) > self.CHART_CACHE_SIZE:
+                self._chart_cache.popitem(last=False)
+        else:
+            self._chart_cache.move_to_end(exercise_id)
+
+        if not series["labels"]:
             return None
+        return {"labels": list(series["labels"]), "data": list(series["data"])}
 
-        history_for_exercise.sort(key=lambda x: x["date"])
-        labels = [h["date"] for h in history_for_exercise]
-        data = [
-            calculate_one_rep_max([s for s in h["sets"] if s.get("type") == "normal"])
-            for h in history_for_exercise
-        ]
-        return {"labels": labels, "data": data}
-    
+    def _add_chart_points(self, workout_session: Dict[str, Any]) -> None:
+        for exercise_entry in workout_session.get("exercises", []):
+            series = self._chart_cache.get(exercise_entry.get("exerciseId"))
+            if series is None:
+                continue
+            i = bisect_right(series["labels"], workout_session["date"])
+            series["labels"].insert(i, workout_session["date"])
+            series["data"].insert(i, _session_one_rep_max(exercise_entry["sets"]))
+
+    def _remove_chart_points(self, workout_session: Dict[str, Any]) -> None:
+        for exercise_entry in workout_session.get("exercises", []):
+            series = self._chart_cache.get(exercise_entry.get("exerciseId"))
+            if series is None:
+                continue
+            labels = series["labels"]
+            value = _session_one_rep_max(exercise_entry["sets"])
+            lo = bisect_left(labels, workout_session["date"])
+            hi = bisect_right(labels, workout_session["date"])
+            # в одну секунду могло попасть несколько точек: удаляем ту, что с тем же значением
+            i = next((j for j in range(lo, hi) if series["data"][j] == value), None)
+            if i is None:
+                # кэш разошёлся с историей - проще пересчитать при следующем запросе
+                del self._chart_cache[exercise_entry.get("exerciseId")]
+                continue
+            del labels[i]
+            del series["data"][i]
+
+    def invalidate_chart_cache(self) -> None:
+        self._chart_cache.clear()
 
     def reset_all_data(self) -> None:
         self.storage.set({
@@ -283,4 +385,7 @@ class WorkoutService:
             "activeProgramId": None,
         })
         self.session.reset()
+        self.replay.clear()
+        self.invalidate_chart_cache()
+        self._invalidate_plan()
         self.storage.save()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logic.storage import BackgroundSaver
+
+
+class SessionJournal:
+    # Журнал несохранённой тренировки: по строке JSON на каждое изменение подходов.
+    # Первая строка - {"op": "start", "programId": ...}; start() переписывает файл заново,
+    # append() дописывает в конец. Запись идёт в фоновом потоке, основной файл данных не трогается.
+
+    def __init__(self, path: str, delay: float = 0.2, before_reset: Optional[Callable[[], None]] = None) -> None:
+        self.path = path
+        self.delay = delay
+        # before_reset вызывается в потоке журнала перед тем, как затереть старую тренировку:
+        # к этому моменту сохранённая тренировка должна уже лежать в основном файле
+        self.before_reset = before_reset
+        self._saver: Optional[BackgroundSaver] = None
+
+    def read(self) -> List[Dict[str, Any]]:
+        records = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # процесс убили посреди записи строки
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def start(self, header: Dict[str, Any]) -> None:
+        self._submit({"reset": json.dumps({"op": "start", **header}), "lines": []})
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._submit({"reset": None, "lines": [json.dumps(record, ensure_ascii=False)]})
+
+    def flush(self) -> None:
+        if self._saver is not None:
+            self._saver.flush()
+
+    def _submit(self, batch: Dict[str, Any]) -> None:
+        # поток заводится при первой записи: только читающим (CLI) он не нужен
+        if self._saver is None:
+            self._saver = BackgroundSaver(self, self.delay, name="session-journal")
+        self._saver.submit(batch)
+
+    def _merge_snapshots(self, older: Any, newer: Any) -> Optional[Any]:
+        if newer["reset"] is not None:
+            return newer
+        return {"reset": older["reset"], "lines": older["lines"] + newer["lines"]}
+
+    def _write(self, batch: Any) -> None:
+        lines = batch["lines"]
+        if batch["reset"] is not None:
+            if self.before_reset is not None:
+                self.before_reset()
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write("\n".join([batch["reset"]] + lines) + "\n")
+        elif lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def _write_failed(self, batch: Any) -> None:
+        # журнал - только страховка от падения, тренировка целиком живёт в памяти до сохранения
+        pass
@@ -1,57 +1,163 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-import time
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from app.logic.models import IdAllocator
+
+if TYPE_CHECKING:
+    from app.logic.session_journal import SessionJournal
+
+VALIDATED_FIELDS = ("weight", "reps")
 
 
 class SessionState:
-    def __init__(self) -> None:
-        self.current_workout_state: Dict[int, List[Dict[str, Any]]] = {}
+    # Текущая (несохранённая) тренировка: exerciseId -> {setId: подход} в порядке добавления.
+    # Число полей с ошибкой ведётся на лету, чтобы проверка перед сохранением не обходила все подходы.
+    # Если передан journal, каждое изменение дописывается в него и восстанавливается через restore().
+
+    def __init__(self, journal: Optional["SessionJournal"] = None, ids: Optional[IdAllocator] = None) -> None:
+        self._sets: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self._error_count = 0
+        self.ids = ids or IdAllocator()
+        self.program_id: Optional[int] = None
+        self.journal = journal
+        self._journal_started = False
+        self._replaying = False
 
     def reset(self) -> None:
-        self.current_workout_state = {}
+        self._clear(None)
+        self._start_journal()
 
     def init_for_program(self, program: Dict[str, Any]) -> None:
-        self.reset()
+        self._clear(program)
+        self._start_journal()
+
+    def _clear(self, program: Optional[Dict[str, Any]]) -> None:
+        self._sets = {}
+        self._error_count = 0
+        self.program_id = program["id"] if program else None
         if not program:
             return
         for ex in program.get("exercises", []):
-            self.current_workout_state[ex["id"]] = []
+            self._sets[ex["id"]] = {}
 
-    def add_set(self, exercise_id: int) -> None:
-        if exercise_id not in self.current_workout_state:
-            self.current_workout_state[exercise_id] = []
-        self.current_workout_state[exercise_id].append({
-            "id": int(time.time() * 1000),
+    def restore(self, program: Optional[Dict[str, Any]]) -> bool:
+        # поднимает тренировку из журнала, если он начат для этой же программы
+        self._clear(program)
+        self._journal_started = False
+        if self.journal is None or not program:
+            return False
+        records = self.journal.read()
+        if not records or records[0].get("op") != "start" or records[0].get("programId") != program["id"]:
+            return False
+
+        self._replaying = True
+        try:
+            for record in records[1:]:
+                self._apply(record)
+        finally:
+            self._replaying = False
+        self._journal_started = True
+        return True
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        exercise_id = record.get("exerciseId")
+        if op == "add":
+            new_set = record["set"]
+            sets = self._sets.setdefault(exercise_id, {})
+            if new_set["id"] in sets:
+                self._error_count -= _error_fields(sets[new_set["id"]])
+            sets[new_set["id"]] = new_set
+            self.ids.observe(new_set["id"])
+            self._error_count += _error_fields(new_set)
+        elif op == "delete":
+            self.delete_set(exercise_id, record["setId"])
+        elif op == "update":
+            self.update_set(exercise_id, record["setId"], record["prop"], record["value"])
+        elif op == "error":
+            self.update_set_error(exercise_id, record["setId"], record["prop"], record["value"])
+        elif op == "add_exercise":
+            self.add_exercise(exercise_id)
+        elif op == "remove_exercise":
+            self.remove_exercise(exercise_id)
+
+    def _start_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.start({"programId": self.program_id})
+            self._journal_started = True
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        if self.journal is None or self._replaying:
+            return
+        if not self._journal_started:
+            # в журнале чужая (или никакая) тренировка - начинаем его с текущего состояния
+            self.journal.start({"programId": self.program_id})
+            self._journal_started = True
+            for exercise_id, sets in self._sets.items():
+                self.journal.append({"op": "add_exercise", "exerciseId": exercise_id})
+                for s in sets.values():
+                    self.journal.append({"op": "add", "exerciseId": exercise_id, "set": s})
+        self.journal.append(record)
+
+    def add_exercise(self, exercise_id: int) -> None:
+        self._sets.setdefault(exercise_id, {})
+        self._log({"op": "add_exercise", "exerciseId": exercise_id})
+
+    def remove_exercise(self, exercise_id: int) -> None:
+        for s in self._sets.pop(exercise_id, {}).values():
+            self._error_count -= _error_fields(s)
+        self._log({"op": "remove_exercise", "exerciseId": exercise_id})
+
+    def sets(self, exercise_id: int) -> List[Dict[str, Any]]:
+        return list(self._sets.get(exercise_id, {}).values())
+
+    def snapshot(self) -> Dict[int, List[Dict[str, Any]]]:
+        return {ex_id: list(sets.values()) for ex_id, sets in self._sets.items()}
+
+    def add_set(self, exercise_id: int) -> Dict[str, Any]:
+        new_set = {
+            "id": self.ids.next(),
             "type": "normal",
             "weight": "",
             "reps": "",
-        })
+        }
+        self._sets.setdefault(exercise_id, {})[new_set["id"]] = new_set
+        self._log({"op": "add", "exerciseId": exercise_id, "set": new_set})
+        return new_set
 
     def delete_set(self, exercise_id: int, set_id: int) -> None:
-        self.current_workout_state[exercise_id] = [
-            s for s in self.current_workout_state.get(exercise_id, []) if s["id"] != set_id
-        ]
+        removed = self._sets.get(exercise_id, {}).pop(set_id, None)
+        if removed is not None:
+            self._error_count -= _error_fields(removed)
+            self._log({"op": "delete", "exerciseId": exercise_id, "setId": set_id})
 
     def update_set(self, exercise_id: int, set_id: int, prop: str, value: str) -> None:
-        for s in self.current_workout_state.get(exercise_id, []):
-            if s["id"] == set_id:
-                s[prop] = value
-                break
+        s = self._find(exercise_id, set_id)
+        if s is not None and s.get(prop) != value:
+            s[prop] = value
+            self._log({"op": "update", "exerciseId": exercise_id, "setId": set_id, "prop": prop, "value": value})
 
     def update_set_error(self, exercise_id: int, set_id: int, prop: str, has_error: bool) -> None:
-        for s in self.current_workout_state.get(exercise_id, []):
-            if s["id"] == set_id:
-                if "errors" not in s:
-                    s["errors"] = {}
-                s["errors"][prop] = has_error
-                break
+        s = self._find(exercise_id, set_id)
+        if s is None:
+            return
+        errors = s.setdefault("errors", {})
+        was_error = bool(errors.get(prop, False))
+        errors[prop] = has_error
+        if prop in VALIDATED_FIELDS and was_error != bool(has_error):
+            self._error_count += 1 if has_error else -1
+            self._log({"op": "error", "exerciseId": exercise_id, "setId": set_id, "prop": prop, "value": has_error})
 
     def has_validation_errors(self) -> bool:
-        for _, sets in self.current_workout_state.items():
-            for s in sets:
-                errors = s.get("errors", {})
-                if errors.get("weight", False) or errors.get("reps", False):
-                    return True
-        return False
+        return self._error_count > 0
+
+    def _find(self, exercise_id: int, set_id: int) -> Optional[Dict[str, Any]]:
+        sets = self._sets.get(exercise_id)
+        return sets.get(set_id) if sets is not None else None
+
+
+def _error_fields(s: Dict[str, Any]) -> int:
+    errors = s.get("errors", {})
+    return sum(1 for prop in VALIDATED_FIELDS if errors.get(prop, False))
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.logic.models import ExerciseColumns, ExerciseRecord
+from app.logic.storage import AppStorage, detect_backend, detect_file_backend, load_app_data
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS programs (
+    pk INTEGER PRIMARY KEY,
+    id INTEGER,
+    name TEXT NOT NULL,
+    progression_type TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS exercises (
+    pk INTEGER PRIMARY KEY,
+    program_pk INTEGER NOT NULL,
+    id INTEGER,
+    name TEXT NOT NULL,
+    next_target TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    pk INTEGER PRIMARY KEY,
+    id INTEGER,
+    date TEXT NOT NULL,
+    program_id INTEGER,
+    program_name TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS session_exercises (
+    pk INTEGER PRIMARY KEY,
+    session_pk INTEGER NOT NULL,
+    exercise_id INTEGER,
+    exercise_name TEXT,
+    date TEXT NOT NULL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS sets (
+    pk INTEGER PRIMARY KEY,
+    session_exercise_pk INTEGER NOT NULL,
+    id INTEGER,
+    type TEXT,
+    weight REAL,
+    reps INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_id ON sessions (id);
+CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS idx_session_exercises_exercise_date ON session_exercises (exercise_id, date);
+CREATE INDEX IF NOT EXISTS idx_session_exercises_session ON session_exercises (session_pk);
+CREATE INDEX IF NOT EXISTS idx_sets_session_exercise ON sets (session_exercise_pk);
+"""
+
+_META_KEYS = ("activeProgramId", "userSetupComplete", "lastId", "replayCheckpoints")
+
+
+def _extra(data: Dict[str, Any], known: Iterable[str]) -> Optional[str]:
+    rest = {k: v for k, v in data.items() if k not in known}
+    return json.dumps(rest, ensure_ascii=False) if rest else None
+
+
+def _with_extra(data: Dict[str, Any], extra: Optional[str]) -> Dict[str, Any]:
+    if extra:
+        data.update(json.loads(extra))
+    return data
+
+
+class SQLiteAppStorage(AppStorage):
+    # Программы держатся в app_data целиком (их мало), история читается из базы запросами по индексам.
+    # data_file - путь к старому app_data.json: база лежит рядом (app_data.db), а JSON (в любом из
+    # форматов json/journal/segmented) импортируется один раз.
+
+    def __init__(self, data_file: str = "app_data.json") -> None:
+        super().__init__(data_file)
+        self.db_file = os.path.splitext(data_file)[0] + ".db"
+        self.app_data.pop("workoutHistory")
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            # соединение может открыться в потоке загрузки, а использоваться в UI-потоке
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def load(self) -> None:
+        # JSON новее базы: его с тех пор писало приложение (segmented/json) - база переливается заново
+        stale = detect_backend(self.data_file) != "sqlite"
+        conn = self._connect()
+        if stale or conn.execute("SELECT value FROM meta WHERE key = 'migratedFrom'").fetchone() is None:
+            self._migrate()
+
+        for key, value in conn.execute("SELECT key, value FROM meta"):
+            if key in _META_KEYS:
+                self.app_data[key] = json.loads(value)
+
+        programs: List[Dict[str, Any]] = []
+        by_pk: Dict[int, Dict[str, Any]] = {}
+        for pk, program_id, name, progression_type, extra in conn.execute(
+            "SELECT pk, id, name, progression_type, extra FROM programs ORDER BY pk"
+        ):
+            program = _with_extra(
+                {"id": program_id, "name": name, "progressionType": progression_type, "exercises": []}, extra
+            )
+            by_pk[pk] = program
+            programs.append(program)
+        for program_pk, exercise_id, name, next_target, extra in conn.execute(
+            "SELECT program_pk, id, name, next_target, extra FROM exercises ORDER BY pk"
+        ):
+            if program_pk in by_pk:
+                by_pk[program_pk]["exercises"].append(_with_extra(
+                    {"id": exercise_id, "name": name, "nextTarget": json.loads(next_target) if next_target else None},
+                    extra,
+                ))
+        self.app_data["programs"] = programs
+        self.registry.rebuild(self.app_data.get("programs", []))
+
+    def _migrate(self) -> None:
+        # нет файла - пустые данные по умолчанию
+        legacy_data = load_app_data(
+            self.data_file, detect_file_backend(self.data_file) or "json", follow_sqlite=False
+        )
+
+        conn = self._connect()
+        for table in ("sessions", "session_exercises", "sets"):
+            conn.execute(f"DELETE FROM {table}")
+        self.app_data.update({k: v for k, v in legacy_data.items() if k in _META_KEYS or k == "programs"})
+        self._write_programs()
+        for session in legacy_data.get("workoutHistory", []):
+            self._insert_session(session)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('migratedFrom', ?)", (json.dumps(self.data_file),)
+        )
+        conn.commit()
+
+    def save(self) -> None:
+        try:
+            self._write_programs()
+            self._connect().commit()
+        except sqlite3.Error:
+            pass
+
+    def _write_programs(self) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM programs")
+        conn.execute("DELETE FROM exercises")
+        for program in self.app_data.get("programs", []):
+            cur = conn.execute(
+                "INSERT INTO programs (id, name, progression_type, extra) VALUES (?, ?, ?, ?)",
+                (
+                    program.get("id"), program.get("name", ""), program.get("progressionType"),
+                    _extra(program, ("id", "name", "progressionType", "exercises")),
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO exercises (program_pk, id, name, next_target, extra) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        cur.lastrowid, ex.get("id"), ex.get("name", ""),
+                        json.dumps(ex["nextTarget"], ensure_ascii=False) if ex.get("nextTarget") is not None else None,
+                        _extra(ex, ("id", "name", "nextTarget")),
+                    )
+                    for ex in program.get("exercises", [])
+                ],
+            )
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(self.app_data.get(key))) for key in _META_KEYS],
+        )
+
+    def set(self, new_data: Dict[str, Any]) -> None:
+        new_data = dict(new_data)
+        history = new_data.pop("workoutHistory", None)
+        self.app_data = new_data
+        self.registry.rebuild(self.app_data.get("programs", []))
+        if history is not None:
+            conn = self._connect()
+            for table in ("sessions", "session_exercises", "sets"):
+                conn.execute(f"DELETE FROM {table}")
+            for session in history:
+                self._insert_session(session)
+
+    # history queries
+
+    def get_history(self) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        sessions = [
+            self._session_from_row(row)
+            for row in conn.execute(
+                "SELECT pk, id, date, program_id, program_name, extra FROM sessions ORDER BY date, pk"
+            )
+        ]
+        by_pk = {pk: session for pk, session in sessions}
+        entries = self._entries("ORDER BY se.pk", ())
+        for session_pk, _, entry in entries:
+            by_pk[session_pk]["exercises"].append(entry)
+        return [session for _, session in sessions]
+
+    def iter_history(self, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        page_size = 50
+        offset = 0
+        while True:
+            batch = self._sessions_slice(newest_first, page_size, offset)
+            yield from batch
+            if len(batch) < page_size:
+                return
+            offset += page_size
+
+    def history_page(self, page: int, page_size: int = 20) -> List[Dict[str, Any]]:
+        return self._sessions_slice(True, page_size, page * page_size)
+
+    def sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return self._sessions(f"{where}ORDER BY date, pk", tuple(params))
+
+    def iter_sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        # постранично по (date, pk): в памяти не больше page_size сессий
+        page_size = 200
+        last = None
+        while True:
+            conditions, params = [], []
+            if start is not None:
+                conditions.append("date >= ?")
+                params.append(start)
+            if end is not None:
+                conditions.append("date < ?")
+                params.append(end)
+            if last is not None:
+                conditions.append("(date > ? OR (date = ? AND pk > ?))")
+                params.extend((last[0], last[0], last[1]))
+            where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            conn = self._connect()
+            keys = conn.execute(
+                f"SELECT date, pk FROM sessions {where}ORDER BY date, pk LIMIT ?", (*params, page_size)
+            ).fetchall()
+            if not keys:
+                return
+            yield from self._sessions(
+                f"WHERE pk IN ({', '.join('?' * len(keys))}) ORDER BY date, pk", tuple(pk for _, pk in keys)
+            )
+            if len(keys) < page_size:
+                return
+            last = keys[-1]
+
+    def _sessions_slice(self, newest_first: bool, limit: int, offset: int) -> List[Dict[str, Any]]:
+        order = "date DESC, pk DESC" if newest_first else "date, pk"
+        return self._sessions(f"ORDER BY {order} LIMIT ? OFFSET ?", (limit, offset))
+
+    def _sessions(self, tail: str, params: tuple) -> List[Dict[str, Any]]:
+        sessions = [
+            self._session_from_row(row)
+            for row in self._connect().execute(
+                f"SELECT pk, id, date, program_id, program_name, extra FROM sessions {tail}", params
+            )
+        ]
+        if not sessions:
+            return []
+        by_pk = {pk: session for pk, session in sessions}
+        for session_pk, _, entry in self._entries(
+            f"WHERE se.session_pk IN (SELECT pk FROM sessions {tail}) ORDER BY se.pk", params
+        ):
+            by_pk[session_pk]["exercises"].append(entry)
+        return [session for _, session in sessions]
+
+    def last_exercise_record(self, exercise_id: int) -> Optional[ExerciseRecord]:
+        entries = self._entries("WHERE se.exercise_id = ? ORDER BY se.date DESC, se.session_pk DESC, se.pk LIMIT 1", (exercise_id,))
+        if not entries:
+            return None
+        session_pk, date, entry = entries[0]
+        return ExerciseRecord({"date": date}, entry)
+
+    def exercise_records(self, exercise_id: int, since: Optional[str] = None) -> List[ExerciseRecord]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT se.pk, se.date, st.pk, st.id, st.type, st.weight, st.reps, st.extra "
+            "FROM session_exercises se LEFT JOIN sets st ON st.session_exercise_pk = se.pk "
+            "WHERE se.exercise_id = ? AND se.date >= ? ORDER BY se.date, se.pk, st.pk",
+            (exercise_id, since if since is not None else ""),
+        )
+        entries: List[tuple] = []
+        current_pk = None
+        for se_pk, date, set_pk, set_id, set_type, weight, reps, extra in rows:
+            if se_pk != current_pk:
+                current_pk = se_pk
+                entries.append((date, {"exerciseId": exercise_id, "sets": []}))
+            if set_pk is not None:
+                entries[-1][1]["sets"].append(self._set_from_row(set_id, set_type, weight, reps, extra))
+        return [ExerciseRecord({"date": date}, entry) for date, entry in entries]
+
+    def exercise_columns(self, exercise_id: int, since: Optional[str] = None) -> ExerciseColumns:
+        # колонки собирает сама база: значения, которые не разобрались бы в SetRecord.parse
+        # (в REAL/INTEGER-колонке остался текст), становятся нулём так же, как там
+        conn = self._connect()
+        params = (exercise_id, since if since is not None else "")
+        sessions = conn.execute(
+            "SELECT se.date, (SELECT COUNT(*) FROM sets st WHERE st.session_exercise_pk = se.pk AND st.type = 'normal') "
+            "FROM session_exercises se WHERE se.exercise_id = ? AND se.date >= ? ORDER BY se.date, se.pk",
+            params,
+        ).fetchall()
+        sets = conn.execute(
+            "SELECT CASE WHEN typeof(st.weight) IN ('integer', 'real') THEN CAST(st.weight AS REAL) ELSE 0.0 END, "
+            "CASE WHEN typeof(st.reps) IN ('integer', 'real') THEN CAST(st.reps AS INTEGER) ELSE 0 END "
+            "FROM session_exercises se JOIN sets st ON st.session_exercise_pk = se.pk "
+            "WHERE se.exercise_id = ? AND se.date >= ? AND st.type = 'normal' ORDER BY se.date, se.pk, st.pk",
+            params,
+        ).fetchall()
+        labels, counts = map(list, zip(*sessions)) if sessions else ([], [])
+        weights, reps = map(list, zip(*sets)) if sets else ([], [])
+        return labels, counts, weights, reps
+
+    def _session_from_row(self, row) -> tuple:
+        pk, session_id, date, program_id, program_name, extra = row
+        session = _with_extra(
+            {"id": session_id, "date": date, "programId": program_id, "programName": program_name, "exercises": []},
+            extra,
+        )
+        return pk, session
+
+    def _set_from_row(self, set_id, set_type, weight, reps, extra) -> Dict[str, Any]:
+        return _with_extra({"id": set_id, "type": set_type, "weight": weight, "reps": reps}, extra)
+
+    def _entries(self, tail: str, params: tuple) -> List[tuple]:
+        # tail - WHERE/ORDER BY/LIMIT по session_exercises (алиас se), подходы догружаются тем же фильтром
+        conn = self._connect()
+        entries = []
+        by_pk: Dict[int, Dict[str, Any]] = {}
+        for pk, session_pk, date, exercise_id, exercise_name, extra in conn.execute(
+            "SELECT se.pk, se.session_pk, se.date, se.exercise_id, se.exercise_name, se.extra "
+            f"FROM session_exercises se {tail}",
+            params,
+        ):
+            entry = _with_extra({"exerciseId": exercise_id, "exerciseName": exercise_name, "sets": []}, extra)
+            by_pk[pk] = entry
+            entries.append((session_pk, date, entry))
+        if not by_pk:
+            return entries
+
+        for se_pk, set_id, set_type, weight, reps, extra in conn.execute(
+            "SELECT session_exercise_pk, id, type, weight, reps, extra FROM sets WHERE session_exercise_pk IN "
+            f"(SELECT se.pk FROM session_exercises se {tail}) ORDER BY pk",
+            params,
+        ):
+            by_pk[se_pk]["sets"].append(self._set_from_row(set_id, set_type, weight, reps, extra))
+        return entries
+
+    # history mutations
+
+    def _insert_session(self, session: Dict[str, Any]) -> None:
+        conn = self._connect()
+        date = session.get("date", "")
+        cur = conn.execute(
+            "INSERT INTO sessions (id, date, program_id, program_name, extra) VALUES (?, ?, ?, ?, ?)",
+            (
+                session.get("id"), date, session.get("programId"), session.get("programName"),
+                _extra(session, ("id", "date", "programId", "programName", "exercises")),
+            ),
+        )
+        session_pk = cur.lastrowid
+        for entry in session.get("exercises", []):
+            cur = conn.execute(
+                "INSERT INTO session_exercises (session_pk, exercise_id, exercise_name, date, extra) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    session_pk, entry.get("exerciseId"), entry.get("exerciseName"), date,
+                    _extra(entry, ("exerciseId", "exerciseName", "sets")),
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO sets (session_exercise_pk, id, type, weight, reps, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        cur.lastrowid, s.get("id"), s.get("type"), s.get("weight"), s.get("reps"),
+                        _extra(s, ("id", "type", "weight", "reps")),
+                    )
+                    for s in entry.get("sets", [])
+                ],
+            )
+
+    def append_history(self, session: Dict[str, Any]) -> None:
+        self._insert_session(session)
+
+    def extend_history(self, sessions: List[Dict[str, Any]]) -> None:
+        # одна транзакция на всю пачку: commit делает save()
+        for session in sessions:
+            self._insert_session(session)
+
+    def remove_history(self, session_id: int) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT pk, id, date, program_id, program_name, extra FROM sessions WHERE id = ? ORDER BY pk LIMIT 1",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        session_pk, session = self._session_from_row(row)
+        entries = self._entries("WHERE se.session_pk = ? ORDER BY se.pk", (session_pk,))
+        session["exercises"] = [entry for _, _, entry in entries]
+
+        conn.execute(
+            "DELETE FROM sets WHERE session_exercise_pk IN "
+            "(SELECT pk FROM session_exercises WHERE session_pk = ?)",
+            (session_pk,),
+        )
+        conn.execute("DELETE FROM session_exercises WHERE session_pk = ?", (session_pk,))
+        conn.execute("DELETE FROM sessions WHERE pk = ?", (session_pk,))
+        return session
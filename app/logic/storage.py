@@ -1,19 +1,104 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
+import copy
 import json
-from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.logic.models import (
+    ExerciseColumns, ExerciseRecord, HistoryIndex, HistoryTimeline, IdAllocator, ProgramRegistry, record_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any], indent: Optional[int] = None) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BackgroundSaver:
+    # Отложенная запись: save() только кладёт снимок в очередь, поток склеивает
+    # серию сохранений за delay секунд и пишет на диск один раз.
+
+    def __init__(self, storage: "AppStorage", delay: float = 0.5, name: str = "storage-saver") -> None:
+        # storage - любой объект с _write(snapshot), _write_failed(snapshot) и _merge_snapshots(older, newer)
+        self.storage = storage
+        self.delay = delay
+        self._queue: List[Any] = []
+        self._busy = False
+        self._flushing = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot: Any) -> None:
+        with self._cond:
+            merged = self.storage._merge_snapshots(self._queue[-1], snapshot) if self._queue else None
+            if merged is not None:
+                self._queue[-1] = merged
+            else:
+                self._queue.append(snapshot)
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+            finally:
+                self._flushing -= 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                self._cond.wait_for(lambda: self._flushing, self.delay)
+                batch, self._queue = self._queue, []
+                self._busy = True
+            for snapshot in batch:
+                try:
+                    self.storage._write(snapshot)
+                except OSError:
+                    self.storage._write_failed(snapshot)
+                except Exception:
+                    # не диск, а данные (например, не сериализуемое значение): поток должен жить,
+                    # иначе flush() в on_pause/on_stop будет ждать его вечно
+                    logger.exception("%s: write failed", self._thread.name)
+                    self.storage._write_failed(snapshot)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
 
 
 class AppStorage:
-    def __init__(self, data_file: str = "app_data.json") -> None:
+    def __init__(self, data_file: str = "app_data.json", write_behind: bool = False) -> None:
         self.data_file = data_file
+        self._saver: Optional[BackgroundSaver] = BackgroundSaver(self) if write_behind else None
         self.app_data: Dict[str, Any] = {
             "programs": [],
             "workoutHistory": [],
             "userSetupComplete": False,
             "activeProgramId": None,
         }
+        self.history_index = HistoryIndex()
+        self.timeline = HistoryTimeline(self.app_data["workoutHistory"])
+        self.registry = ProgramRegistry()
+        # читает app_data через get(): после set()/load() сам подхватывает новый lastId
+        self.ids = IdAllocator(self.get)
+
+    def _rebuild_history(self) -> None:
+        self.timeline.rebuild(self.app_data.setdefault("workoutHistory", []))
+        self.history_index.rebuild(self.timeline.sessions)
 
     def load(self) -> None:
         try:
@@ -24,16 +109,307 @@ class AppStorage:
                 self.app_data["workoutHistory"] = []
         except (FileNotFoundError, json.JSONDecodeError):
             pass
+        self._rebuild_history()
+        self.registry.rebuild(self.app_data.get("programs", []))
 
     def save(self) -> None:
+        if self._saver is not None:
+            self._saver.submit(self._snapshot(detached=True))
+            return
+        snapshot = self._snapshot(detached=False)
         try:
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(self.app_data, f, indent=4, ensure_ascii=False)
-        except IOError:
-            pass
+            self._write(snapshot)
+        except OSError:
+            self._write_failed(snapshot)
+
+    def flush(self) -> None:
+        if self._saver is not None:
+            self._saver.flush()
+
+    def _snapshot(self, detached: bool) -> Any:
+        # detached - снимок уйдёт в другой поток: программы копируются целиком (их мало),
+        # история - только список, сами сессии после сохранения не меняются
+        if not detached:
+            return self.app_data
+        return {
+            **self.app_data,
+            "programs": copy.deepcopy(self.app_data.get("programs", [])),
+            "workoutHistory": list(self.app_data.get("workoutHistory", [])),
+        }
+
+    def _write(self, snapshot: Any) -> None:
+        _write_json_atomic(self.data_file, snapshot, indent=4)
+
+    def _write_failed(self, snapshot: Any) -> None:
+        # снимок - весь app_data, следующий save() всё равно запишет его целиком
+        pass
+
+    def _merge_snapshots(self, older: Any, newer: Any) -> Optional[Any]:
+        return newer
 
     def get(self) -> Dict[str, Any]:
         return self.app_data
 
     def set(self, new_data: Dict[str, Any]) -> None:
         self.app_data = new_data
+        self._rebuild_history()
+        self.registry.rebuild(self.app_data.get("programs", []))
+
+    # history queries
+
+    def get_history(self) -> List[Dict[str, Any]]:
+        return self.app_data.get("workoutHistory", [])
+
+    def iter_history(self, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        # история всегда хранится по возрастанию даты, пересортировка не нужна
+        history = self.get_history()
+        return reversed(history) if newest_first else iter(history)
+
+    def sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.timeline.between(start, end)
+
+    def iter_sessions_between(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        # потоковый вариант sessions_between для выгрузки; здесь история и так целиком в памяти
+        return iter(self.timeline.between(start, end))
+
+    def history_page(self, page: int, page_size: int = 20) -> List[Dict[str, Any]]:
+        # страницы считаются от самой свежей тренировки
+        start = page * page_size
+        return list(islice(self.iter_history(newest_first=True), start, start + page_size))
+
+    def last_exercise_record(self, exercise_id: int) -> Optional[ExerciseRecord]:
+        return self.history_index.last_record(exercise_id)
+
+    def last_workout_for_exercise(self, exercise_id: int) -> Optional[Dict[str, Any]]:
+        record = self.last_exercise_record(exercise_id)
+        return record.entry if record is not None else None
+
+    def exercise_records(self, exercise_id: int, since: Optional[str] = None) -> List[ExerciseRecord]:
+        if since is not None:
+            return self.history_index.since(exercise_id, since)
+        return list(self.history_index.entries(exercise_id))
+
+    def exercise_history(self, exercise_id: int, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [{"date": r.date, "sets": r.entry["sets"]} for r in self.exercise_records(exercise_id, since)]
+
+    def exercise_columns(self, exercise_id: int, since: Optional[str] = None) -> ExerciseColumns:
+        # плоские колонки рабочих подходов для analytics: записи индекса держат свои колонки готовыми
+        return record_columns(self.exercise_records(exercise_id, since))
+
+    # history mutations
+
+    def append_history(self, session: Dict[str, Any]) -> None:
+        self.timeline.insert(session)
+        self.history_index.add(session)
+
+    def extend_history(self, sessions: List[Dict[str, Any]]) -> None:
+        # пакетная вставка (импорт): список дополняется целиком, индексы строятся один раз
+        self.app_data.setdefault("workoutHistory", []).extend(sessions)
+        self._rebuild_history()
+
+    def remove_history(self, session_id: int) -> Optional[Dict[str, Any]]:
+        session = self.timeline.pop(session_id)
+        if session is not None:
+            self.history_index.remove(session)
+        return session
+
+
+class JournaledAppStorage(AppStorage):
+    # Снимок (data_file) + журнал изменений (data_file.journal).
+    # Каждая запись журнала - одна строка JSON, поэтому save() пишет только изменения,
+    # а полный снимок переписывается раз в compact_every записей.
+
+    def __init__(self, data_file: str = "app_data.json", write_behind: bool = False, compact_every: int = 500) -> None:
+        super().__init__(data_file, write_behind)
+        self.journal_file = data_file + ".journal"
+        self.compact_every = compact_every
+        self._generation = 0
+        self._journal_records = 0
+        self._pending: List[str] = []
+        self._last_meta: Optional[str] = None
+        self._needs_compaction = False
+        self._journal_valid = False
+
+    def load(self) -> None:
+        super().load()
+        self._generation = self.app_data.pop("_journalGeneration", 0)
+        self._journal_records = self._replay_journal()
+        self._last_meta = self._meta_line()
+        # meta-записи журнала заменяют список программ целиком
+        self.registry.rebuild(self.app_data.get("programs", []))
+
+    def _replay_journal(self) -> int:
+        replayed = 0
+        self._journal_valid = False
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                try:
+                    header = json.loads(f.readline())
+                except json.JSONDecodeError:
+                    return 0
+                if not isinstance(header, dict) or header.get("generation") != self._generation:
+                    # журнал от предыдущего снимка: compact() упал между записью снимка и журнала
+                    return 0
+                self._journal_valid = True
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # оборванная последняя запись
+                        break
+                    self._apply(record)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        return replayed
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        if op == "meta":
+            self.app_data.update(record["data"])
+        elif op == "append":
+            AppStorage.append_history(self, record["session"])
+        elif op == "remove":
+            AppStorage.remove_history(self, record["id"])
+
+    def _meta_line(self) -> str:
+        meta = {k: v for k, v in self.app_data.items() if k != "workoutHistory"}
+        return json.dumps({"op": "meta", "data": meta}, ensure_ascii=False)
+
+    def append_history(self, session: Dict[str, Any]) -> None:
+        super().append_history(session)
+        self._pending.append(json.dumps({"op": "append", "session": session}, ensure_ascii=False))
+
+    def extend_history(self, sessions: List[Dict[str, Any]]) -> None:
+        # пачку выгоднее записать одним снимком, чем тысячами строк журнала
+        super().extend_history(sessions)
+        self._needs_compaction = True
+
+    def remove_history(self, session_id: int) -> Optional[Dict[str, Any]]:
+        removed = super().remove_history(session_id)
+        if removed is not None:
+            self._pending.append(json.dumps({"op": "remove", "id": session_id}))
+        return removed
+
+    def set(self, new_data: Dict[str, Any]) -> None:
+        super().set(new_data)
+        self._needs_compaction = True
+
+    def compact(self) -> None:
+        self._needs_compaction = True
+        self.save()
+
+    def _snapshot(self, detached: bool) -> Any:
+        if self._needs_compaction or self._journal_records >= self.compact_every:
+            self._generation += 1
+            self._journal_valid = True
+            self._journal_records = 0
+            self._pending = []
+            self._last_meta = self._meta_line()
+            self._needs_compaction = False
+            data = super()._snapshot(detached)
+            return {"compact": {**data, "_journalGeneration": self._generation}}
+
+        meta_line = self._meta_line()
+        if meta_line != self._last_meta:
+            self._pending.append(meta_line)
+            self._last_meta = meta_line
+        lines, self._pending = self._pending, []
+        header = None
+        if not self._journal_valid and lines:
+            header = json.dumps({"generation": self._generation})
+            self._journal_valid = True
+        self._journal_records += len(lines)
+        return {"header": header, "lines": lines}
+
+    def _write_failed(self, snapshot: Any) -> None:
+        # строки уже сняты с _pending, а журнал мог остаться без заголовка или с оборванной
+        # записью - вместо дописывания следующий save() перепишет снимок целиком из app_data
+        self._needs_compaction = True
+
+    def _write(self, snapshot: Any) -> None:
+        if "compact" in snapshot:
+            data = snapshot["compact"]
+            _write_json_atomic(self.data_file, data)
+            with open(self.journal_file, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"generation": data["_journalGeneration"]}) + "\n")
+            return
+
+        lines = snapshot["lines"]
+        if snapshot["header"] is not None:
+            with open(self.journal_file, "w", encoding="utf-8") as f:
+                f.write("\n".join([snapshot["header"]] + lines) + "\n")
+        elif lines:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def _merge_snapshots(self, older: Any, newer: Any) -> Optional[Any]:
+        if "compact" in newer:
+            return newer
+        if "compact" in older:
+            return None
+        return {"header": older["header"] or newer["header"], "lines": older["lines"] + newer["lines"]}
+
+
+STORAGE_BACKENDS = {
+    "json": AppStorage,
+    "journal": JournaledAppStorage,
+}
+
+
+def create_storage(data_file: str = "app_data.json", backend: str = "json", write_behind: bool = False) -> AppStorage:
+    if backend == "segmented":
+        from app.logic.segmented_storage import SegmentedAppStorage
+        return SegmentedAppStorage(data_file, write_behind)
+    if backend == "sqlite":
+        if write_behind:
+            raise ValueError("write_behind is not supported by the sqlite backend")
+        from app.logic.sqlite_storage import SQLiteAppStorage
+        return SQLiteAppStorage(data_file)
+    return STORAGE_BACKENDS[backend](data_file, write_behind)
+
+
+def detect_file_backend(data_file: str) -> Optional[str]:
+    # формат самого data_file (и его журнала); None - файла ещё нет
+    try:
+        with open(data_file, "r", encoding="utf-8") as f:
+            saved_data = json.load(f)
+    except FileNotFoundError:
+        saved_data = None
+    except json.JSONDecodeError:
+        saved_data = {}
+    if isinstance(saved_data, dict) and "historySegments" in saved_data:
+        return "segmented"
+    if os.path.exists(data_file + ".journal"):
+        return "journal"
+    return "json" if saved_data is not None else None
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def sqlite_is_newer(data_file: str) -> bool:
+    # база sqlite лежит рядом с data_file и не удаляет его после миграции: живые данные там,
+    # куда писали последним
+    db_file = os.path.splitext(data_file)[0] + ".db"
+    return os.path.exists(db_file) and _mtime(db_file) >= max(_mtime(data_file), _mtime(data_file + ".journal"))
+
+
+def detect_backend(data_file: str) -> Optional[str]:
+    return "sqlite" if sqlite_is_newer(data_file) else detect_file_backend(data_file)
+
+
+def load_app_data(data_file: str, backend: str, follow_sqlite: bool = True) -> Dict[str, Any]:
+    # весь app_data вместе с workoutHistory из хранилища другого формата - для миграций
+    storage = create_storage(data_file, backend)
+    # миграция в sqlite читает файлы мимо базы, которую сама только что создала
+    storage.follow_sqlite = follow_sqlite
+    storage.load()
+    app_data = {**storage.get(), "workoutHistory": list(storage.get_history())}
+    if hasattr(storage, "close"):
+        storage.close()
+    return app_data
@@ -84,6 +84,7 @@ class SettingsTopAppBar(MDBoxLayout):
             self.go_back()
         else:
             self.last_screen = self.screen_manager.current
+            MDApp.get_running_app().ensure_screen("progressive_overload_screen")
             self.screen_manager.transition.direction = 'right'
             self.screen_manager.current = "progressive_overload_screen"
         
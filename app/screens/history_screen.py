@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
+from typing import Any, Dict
+
 from kivymd.app import MDApp
 from kivymd.uix.screen import MDScreen
 from kivymd.uix.boxlayout import MDBoxLayout
-from kivymd.uix.label import MDLabel
-from kivymd.uix.button import MDButton, MDButtonText
-from kivy.properties import ObjectProperty, StringProperty
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.properties import NumericProperty, ObjectProperty, StringProperty
+from kivy.metrics import dp
 from kivy.clock import Clock
 
 
@@ -14,74 +16,122 @@ def _logic():
     return MDApp.get_running_app().logic
 
 
-class HistoryExerciseItem(MDBoxLayout):
-    exercise_name = StringProperty("")
-    sets_summary = StringProperty("")
-
-
-class HistorySessionCard(MDBoxLayout):
+def session_view_model(session: Dict[str, Any]) -> Dict[str, Any]:
+    # всё, что нужно карточке, считается один раз при загрузке страницы
+    lines = []
+    for ex in session.get("exercises", []):
+        name = ex.get("exerciseName", f"#{ex.get('exerciseId')}")
+        parts = []
+        for s in ex.get("sets", []):
+            if s.get("type") == "normal":
+                reps = str(s.get("reps", ""))
+                w = str(s.get("weight", ""))
+                parts.append(f"{reps}x{w}кг")
+        lines.append(f"[b]{name}[/b]\n{', '.join(parts)}")
+    return {
+        "session_id": session.get("id") or 0,
+        "date": session.get("date", "Unknown Date"),
+        "program_name": session.get("programName", ""),
+        "exercises_text": "\n".join(lines),
+        # оценка до раскладки: точную высоту карточка выставит по тексту (HistorySessionCard._sync_height)
+        "height": dp(70) + dp(44) * len(lines),
+    }
+
+
+class HistorySessionCard(RecycleDataViewBehavior, MDBoxLayout):
     screen = ObjectProperty(None)
-    session = ObjectProperty(allownone=True)
-
-    def on_kv_post(self, base_widget):
-        container = self.ids.history_items_container
-        container.clear_widgets()
-        if not self.session:
+    session_id = NumericProperty(0)
+    date = StringProperty("")
+    program_name = StringProperty("")
+    exercises_text = StringProperty("")
+    _rv = None
+    _index = None
+
+    def refresh_view_attrs(self, rv, index, data):
+        self._rv, self._index = rv, index
+        result = super().refresh_view_attrs(rv, index, data)
+        # переиспользованная карточка с текстом той же высоты не получит on_minimum_height
+        Clock.schedule_once(self._sync_height, 0)
+        return result
+
+    def on_minimum_height(self, instance, height):
+        self._sync_height()
+
+    def _sync_height(self, *args):
+        # длинные строки переносятся по ширине, поэтому высоту строки RecycleView задаёт текст:
+        # записываем её в модель карточки, и layout пересчитывает только эту строку
+        rv, index = self._rv, self._index
+        if rv is None or index is None or index >= len(rv.data):
             return
-        for ex in self.session.get("exercises", []):
-            name = ex.get("exerciseName", f"#{ex.get('exerciseId')}")
-            parts = []
-            for s in ex.get("sets", []):
-                if s.get("type") == "normal":
-                    reps = str(s.get("reps", ""))
-                    w = str(s.get("weight", ""))
-                    parts.append(f"{reps}x{w}кг")
-            container.add_widget(
-                HistoryExerciseItem(
-                    exercise_name=name,
-                    sets_summary=", ".join(parts),
-                )
-            )
+        vm = rv.data[index]
+        if abs(vm.get("height", 0) - self.minimum_height) >= 1:
+            vm["height"] = self.minimum_height
+            rv.data[index] = vm
 
 
 class HistoryScreen(MDScreen):
+    page_size = 20
+    _next_page = 0
+    _has_more = False
+    _loading = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._view_models: Dict[Any, Dict[str, Any]] = {}
+
     def on_enter(self, *args):
         Clock.schedule_once(self.render_workout_history, 0)
 
-    def _history_container(self):
-        return self.ids.full_history_container
+    def _history_view(self):
+        return self.ids.history_recycle_view
 
     def render_workout_history(self, *args):
-        container = self._history_container()
-        container.clear_widgets()
-
-        try:
-            history = _logic().list_workout_history()
-        except AttributeError:
-            try:
-                history = _logic().storage.get().get("workoutHistory", [])
-            except Exception:
-                history = []
-
-        if not history:
-            container.add_widget(
-                MDLabel(
-                    text="История пуста",
-                    halign="center",
-                    theme_text_color="Secondary",
-                )
-            )
+        view = self._history_view()
+        view.data = []
+        view.scroll_y = 1
+        self._view_models = {}
+
+        self._next_page = 0
+        self._has_more = True
+        self.load_next_page()
+
+    def _view_model(self, session):
+        # сессии в истории не меняются, поэтому модель карточки можно переиспользовать
+        vm = self._view_models.get(session.get("id"))
+        if vm is None:
+            vm = session_view_model(session)
+            vm["screen"] = self
+            self._view_models[session.get("id")] = vm
+        return vm
+
+    def load_next_page(self, *args):
+        if not self._has_more or self._loading:
             return
-
-        history_sorted = sorted(history, key=lambda s: s.get("date", ""), reverse=True)
-
-        for session in history_sorted:
-            card = HistorySessionCard(screen=self, session=session)
-            container.add_widget(card)
+        self._loading = True
+        try:
+            history_page = _logic().get_workout_history_page(self._next_page, self.page_size)
+            self._next_page += 1
+            self._has_more = len(history_page) == self.page_size
+            self._history_view().data.extend(self._view_model(s) for s in history_page)
+        finally:
+            self._loading = False
+        self.ids.history_empty_label.opacity = 0 if self._history_view().data else 1
+
+    def on_history_scroll(self, scroll_view, scroll_y):
+        # подгружаем следующую страницу, когда пользователь долистал почти до конца
+        if self._has_more and scroll_y <= 0.05:
+            Clock.schedule_once(self.load_next_page, 0)
 
     def delete_history_session(self, session_id):
         if not session_id:
             return
         _logic().delete_history_session(int(session_id))
-        
-        Clock.schedule_once(self.render_workout_history, 0)
+
+        # перечитываем уже показанные страницы одним запросом, чтобы не сбить смещение
+        # следующей страницы и сохранить позицию прокрутки
+        view = self._history_view()
+        loaded = self._next_page * self.page_size
+        sessions = _logic().get_workout_history_page(0, loaded) if loaded else []
+        self._has_more = len(sessions) == loaded
+        view.data = [self._view_model(s) for s in sessions]
+        self.ids.history_empty_label.opacity = 0 if view.data else 1
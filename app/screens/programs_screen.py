@@ -25,7 +25,7 @@ class ProgramCard(MDCard):
             logic = _logic()
             logic.select_program(self.program_id)
             
-            detail_screen = self.screen.manager.get_screen("program_detail")
+            detail_screen = MDApp.get_running_app().ensure_screen("program_detail")
             detail_screen.program_id = self.program_id
             self.screen.manager.transition.direction = "left"
             self.screen.manager.current = "program_detail"
@@ -83,7 +83,7 @@ class ProgramsScreen(MDScreen):
             logic = _logic()
             logic.select_program(program_id)
             
-            detail_screen = self.manager.get_screen("program_detail")
+            detail_screen = MDApp.get_running_app().ensure_screen("program_detail")
             detail_screen.program_id = program_id
             self.manager.transition.direction = "left"
             self.manager.current = "program_detail"
@@ -93,6 +93,17 @@ class ProgramsScreen(MDScreen):
         container.clear_widgets()
         
         logic = _logic()
+        if logic is None:
+            # данные ещё грузятся в фоне, MainApp вызовет on_enter, когда они будут готовы или загрузка упадёт
+            error = MDApp.get_running_app().logic_error
+            container.add_widget(
+                MDLabel(
+                    text=f"Не удалось загрузить данные\n{error}" if error else "Загрузка...",
+                    halign="center",
+                    theme_text_color="Error" if error else "Secondary",
+                )
+            )
+            return
 
         try:
             programs = logic.list_programs()
@@ -126,6 +137,8 @@ class ProgramsScreen(MDScreen):
             self.populate_program_list()
 
     def show_new_program_dialog(self):
+        if _logic() is None:
+            return
         if not self.new_program_dialog:
             self.new_program_dialog = NewProgramDialog(screen=self)
         self.new_program_dialog.open()
@@ -22,8 +22,6 @@ from kivy.uix.widget import Widget
 from kivymd.uix.button import MDButton, MDButtonText
 from kivymd.uix.label import MDLabel
 
-from app.logic.progression import calculate_next_target
-
 
 def _logic():
     return MDApp.get_running_app().logic
@@ -33,6 +31,65 @@ def _session_snapshot():
     return _logic().get_current_workout_state()
 
 
+class LayoutScheduler:
+    # Копит запросы на do_layout до следующего кадра и выполняет каждый виджет один раз:
+    # сначала вложенные, потом родители, чтобы родитель видел уже пересчитанные размеры детей
+
+    def __init__(self) -> None:
+        self._pending = {}
+        self._trigger = Clock.create_trigger(self._run, -1)
+        self.passes = 0
+
+    def request(self, *widgets) -> None:
+        for widget in widgets:
+            if widget is not None and hasattr(widget, "do_layout"):
+                self._pending[widget] = None
+        if self._pending:
+            self._trigger()
+
+    def _run(self, *args) -> None:
+        pending, self._pending = list(self._pending), {}
+        pending.sort(key=_widget_depth, reverse=True)
+        for widget in pending:
+            widget.do_layout()
+        self.passes += 1
+
+
+def _widget_depth(widget) -> int:
+    depth = 0
+    while widget.parent is not None and widget.parent is not widget:
+        widget = widget.parent
+        depth += 1
+    return depth
+
+
+_layout_scheduler = LayoutScheduler()
+
+
+class WidgetPool:
+    # Отцепленные виджеты одного класса: вместо создания из kv берём свободный и перепривязываем данные
+
+    def __init__(self, factory, limit: int = 128) -> None:
+        self._factory = factory
+        self._free = []
+        self.limit = limit
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self):
+        if self._free:
+            self.reused += 1
+            return self._free.pop()
+        self.created += 1
+        return self._factory()
+
+    def release(self, widget) -> None:
+        if widget.parent:
+            widget.parent.remove_widget(widget)
+        if len(self._free) < self.limit:
+            self._free.append(widget)
+
+
 class WorkoutSummaryContent(MDBoxLayout):
     summary_text = StringProperty("")
 
@@ -47,6 +104,18 @@ class NewSetRow(MDBoxLayout):
     weight_error = BooleanProperty(False)
     reps_error = BooleanProperty(False)
 
+    def bind_set(self, panel, exercise_id, set_id, weight, reps, set_number):
+        # сначала идентификаторы: on_weight/on_reps валидируют уже новый подход
+        self.panel_ref = panel
+        self.exercise_id = exercise_id
+        self.set_id = set_id
+        self.weight_error = False
+        self.reps_error = False
+        self.weight = weight
+        self.reps = reps
+        self.set_number = set_number
+        return self
+
     def on_weight(self, instance, value):
         self._validate_and_update('weight', value)
 
@@ -75,6 +144,8 @@ class NewSetRow(MDBoxLayout):
             Clock.schedule_once(lambda dt: setattr(self, target_property, True), 0)
 
         logic = _logic()
+        # значение пишется в сессию сразу, чтобы журнал тренировки не отставал от ввода
+        logic.update_set_in_workout(self.exercise_id, self.set_id, property_name, value)
         logic.update_set_error_state(self.exercise_id, self.set_id, property_name, not is_valid)
 
 
@@ -96,24 +167,34 @@ class ExpansionPanelItem(MDExpansionPanel):
     target_info = StringProperty("")
     last_workout_info = StringProperty("")
 
-    def on_open(self, *args):
-        temp_row = self.add_set_row(return_row=True)
-        if temp_row is not None:
-            Clock.schedule_once(lambda dt: self.remove_set_row(temp_row), 0)
-        Clock.schedule_once(lambda dt: self._force_layout_update_chain(), 0.2)
+    def bind_exercise(self, exercise_id, exercise_name, target_info, last_workout_info):
+        self.exercise_id = exercise_id
+        self.exercise_name = exercise_name
+        self.target_info = target_info
+        self.last_workout_info = last_workout_info
+        return self
 
-    def _force_layout_update_chain(self):
-        try:
-            if hasattr(self, "ids") and "new_sets_container" in self.ids:
-                cont = self.ids.new_sets_container
-                if hasattr(cont, "do_layout"):
-                    cont.do_layout()
-            if self.parent and hasattr(self.parent, "do_layout"):
-                self.parent.do_layout()
-            if self.parent and self.parent.parent and hasattr(self.parent.parent, "do_layout"):
-                self.parent.parent.do_layout()
-        except Exception:
-            pass
+    def release_rows(self):
+        for set_row in list(self.ids.new_sets_container.children):
+            _set_row_pool.release(set_row)
+
+    def reset(self):
+        # панель из пула должна выглядеть как новая: без подходов и свёрнутая
+        self.release_rows()
+        if self.is_open:
+            self.close()
+            self.set_chevron_up(self.ids.chevron)
+
+    def on_open(self, *args):
+        # высота содержимого меняется после открытия - пересчитываем раскладку, подходы не трогаем
+        self.request_layout()
+
+    def request_layout(self):
+        # контейнер подходов, панель и список панелей - не чаще одного раза за кадр на всех
+        parent = self.parent
+        _layout_scheduler.request(
+            self.ids.new_sets_container, parent, parent.parent if parent is not None else None
+        )
 
     def add_set_row(self, set_data=None, return_row: bool = False):
         logic = _logic()
@@ -126,25 +207,13 @@ class ExpansionPanelItem(MDExpansionPanel):
             weight = str(set_data.get("weight", ""))
             reps = str(set_data.get("reps", ""))
         else:
-            logic.add_set_to_workout(exercise_id)
-            sets_for_ex = _session_snapshot().get(exercise_id, [])
-            if not sets_for_ex:
-                return None if return_row else None
-            new_set = sets_for_ex[-1]
-            set_id = new_set["id"]
+            set_id = logic.add_set_to_workout(exercise_id)["id"]
             weight, reps = "", ""
 
-        set_row = NewSetRow(
-            exercise_id=exercise_id,
-            set_id=set_id,
-            weight=weight,
-            reps=reps,
-            panel_ref=self,
-        )
-        set_row.set_number = set_number
+        set_row = _set_row_pool.acquire().bind_set(self, exercise_id, set_id, weight, reps, set_number)
         self.ids.new_sets_container.add_widget(set_row)
 
-        Clock.schedule_once(lambda dt: self._force_layout_update_chain(), 0.05)
+        self.request_layout()
 
         return set_row if return_row else None
 
@@ -154,15 +223,19 @@ class ExpansionPanelItem(MDExpansionPanel):
         except Exception:
             pass
 
-        if set_row.parent:
-            set_row.parent.remove_widget(set_row)
+        _set_row_pool.release(set_row)
+
+        self.request_layout()
+
 
-        Clock.schedule_once(lambda dt: self._force_layout_update_chain(), 0.05)
+_set_row_pool = WidgetPool(NewSetRow)
+_panel_pool = WidgetPool(ExpansionPanelItem, limit=32)
 
 
 class WorkoutScreen(MDScreen):
     dialog = None
     pending_workout_data = None
+    _placeholder = None
 
     def on_enter(self, *args):
         Clock.schedule_once(self.render_todays_workout)
@@ -170,50 +243,33 @@ class WorkoutScreen(MDScreen):
     def render_todays_workout(self, *args):
         logic = _logic()
         container = self.ids.today_workout_container
+        for widget in list(container.children):
+            if isinstance(widget, ExpansionPanelItem):
+                widget.reset()
+                _panel_pool.release(widget)
         container.clear_widgets()
 
         active_program = logic.get_active_program()
 
         if not active_program:
-            placeholder = MDLabel(
-                text="Нет активной программы",
-                halign="center",
-                theme_text_color="Secondary",
-            )
-            container.add_widget(placeholder)
+            if self._placeholder is None:
+                self._placeholder = MDLabel(
+                    text="Нет активной программы",
+                    halign="center",
+                    theme_text_color="Secondary",
+                )
+            container.add_widget(self._placeholder)
             return
 
         snapshot = _session_snapshot()
-        progression_type = active_program.get("progressionType", "double")
-
-        for ex in active_program["exercises"]:
-            last_workout = logic.get_last_workout_for_exercise(ex['id'])
-            next_target = calculate_next_target(ex, last_workout, progression_type)
-
-            last_workout_text = ""
-            if last_workout:
-                sets_list = last_workout.get("sets", [])
-                last_workout_text = ("Прошлая: " + ", ".join([f"{s['reps']}x{s['weight']}кг" for s in sets_list])
-                                     if sets_list else "Прошлая тренировка без рабочих подходов")
-            else:
-                last_workout_text = "Это первая тренировка!"
-
-            target_text = "Цель не рассчитана"
-            if next_target:
-                base_text = next_target.get('text', '')
-                if last_workout:
-                    w = next_target.get("weight", "")
-                    w_text = f" с весом ~[b]{w} кг[/b]" if w else ""
-                    target_text = f"Цель: {base_text}{w_text}"
-                else:
-                    target_text = f"Цель: {base_text}"
-
-            panel = ExpansionPanelItem(
-                exercise_id=ex["id"],
-                exercise_name=ex["name"],
-                target_info=target_text,
-                last_workout_info=last_workout_text,
-            )
+        plan = logic.get_workout_plan()
+
+        for exercise_plan in plan.exercises.values():
+            ex = exercise_plan.exercise
+            target_text = exercise_plan.target_text
+            last_workout_text = exercise_plan.last_workout_text
+
+            panel = _panel_pool.acquire().bind_exercise(ex["id"], ex["name"], target_text, last_workout_text)
 
             for s in snapshot.get(ex["id"], []):
                 panel.add_set_row(set_data=s)
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
+import importlib
+import threading
 from kivymd.app import MDApp
 from kivy.lang import Builder
 from kivy.core.window import Window
@@ -10,32 +12,42 @@ from kivymd.uix.expansionpanel import MDExpansionPanel
 
 from kivy.metrics import dp
 from kivy.clock import Clock
+from kivy.logger import Logger
 
 from app.logic.logic import ProgressiveOverloadLogic
-from app.logic.components import BaseMDNavigationItem, SettingsTopAppBar
+from app.screens.components import BaseMDNavigationItem, SettingsTopAppBar
 
 from app.screens.programs_screen import ProgramsScreen, NewProgramDialog, ProgramCard
-from app.screens.program_detail_screen import ProgramDetailScreen, ExerciseItem
 from app.screens.main_screen import MainScreen
-from app.screens.history_screen import HistoryScreen
-from app.screens.workout_screen import (
-    WorkoutScreen,
-    NewSetRow,
-    TrailingPressedIconButton,
-    ExpansionPanelItem,
-    ClickableMDBoxLayout
-)
-from app.screens.graph_screen import GraphScreen
-from app.screens.progressive_overload_screen import ProgressiveOverloadScreen
 
 Window.keyboard_anim_args = {"d": .2, "t": "in_out_quart"}
 Window.softinput_mode = "below_target"
 
 #Window.size = (359, 751)
 
+# Экраны, которые не нужны на старте: модуль и kv грузятся при первом переходе (или при прогреве)
+LAZY_SCREENS = {
+    "workout_screen": ("app.screens.workout_screen", "WorkoutScreen", "app/kv/workout_screen.kv"),
+    "history_screen": ("app.screens.history_screen", "HistoryScreen", "app/kv/history_screen.kv"),
+    "graph_screen": ("app.screens.graph_screen", "GraphScreen", "app/kv/graph_screen.kv"),
+    "program_detail": ("app.screens.program_detail_screen", "ProgramDetailScreen", "app/kv/program_detail_screen.kv"),
+    "progressive_overload_screen": (
+        "app.screens.progressive_overload_screen", "ProgressiveOverloadScreen", "app/kv/progressive_overload_screen.kv"
+    ),
+}
+
+
 class MainApp(MDApp):
+    prewarm_screens = True
+
     def build(self):
-        self.logic = ProgressiveOverloadLogic(data_file="app_data.json")
+        self._loaded_kv = set()
+        # данные читаются в отдельном потоке, UI строится сразу; до готовности logic = None
+        self.logic = None
+        # текст ошибки, если данные так и не загрузились; экран программ показывает его вместо "Загрузка..."
+        self.logic_error = None
+        self._pending_screen = None
+        threading.Thread(target=self._load_logic, name="logic-loader", daemon=True).start()
 
         self.theme_cls.theme_style = "Light"
         self.theme_cls.primary_palette = "Blue"
@@ -44,6 +56,74 @@ class MainApp(MDApp):
 
     def on_start(self):   
         self.root.ids.screen_manager.current = "programs_screen"
+        if self.prewarm_screens:
+            # после первого кадра догружаем остальные экраны по одному за кадр
+            Clock.schedule_once(self._prewarm_next_screen, 0.5)
+
+    def _load_logic(self):
+        try:
+            logic = ProgressiveOverloadLogic(
+                data_file="app_data.json", storage_backend="segmented", write_behind=True, session_journal=True
+            )
+        except Exception as e:
+            # без logic приложение не работает, но и молча висеть на "Загрузка..." нельзя;
+            # пустую logic не подставляем: первое же сохранение затёрло бы данные на диске
+            Logger.exception("MainApp: failed to load app data")
+            error = f"{type(e).__name__}: {e}"
+            Clock.schedule_once(lambda dt: self._on_logic_failed(error), 0)
+            return
+        Clock.schedule_once(lambda dt: self._on_logic_ready(logic), 0)
+
+    def _on_logic_failed(self, error):
+        self.logic_error = error
+        self._pending_screen = None
+        screen_manager = self.root.ids.screen_manager
+        if screen_manager.current != "programs_screen":
+            screen_manager.current = "programs_screen"
+        else:
+            screen_manager.current_screen.on_enter()
+
+    def _on_logic_ready(self, logic):
+        self.logic = logic
+        screen_manager = self.root.ids.screen_manager
+        if self._pending_screen is not None:
+            # пока шла загрузка, пользователь переключил вкладку
+            self.ensure_screen(self._pending_screen)
+            screen_manager.current, self._pending_screen = self._pending_screen, None
+        elif hasattr(screen_manager.current_screen, "on_enter"):
+            screen_manager.current_screen.on_enter()
+
+    def ensure_screen(self, name: str):
+        screen_manager = self.root.ids.screen_manager
+        if screen_manager.has_screen(name):
+            return screen_manager.get_screen(name)
+        if name not in LAZY_SCREENS:
+            return None
+
+        module_name, class_name, kv_file = LAZY_SCREENS[name]
+        screen_class = getattr(importlib.import_module(module_name), class_name)
+        if kv_file not in self._loaded_kv:
+            Builder.load_file(kv_file)
+            self._loaded_kv.add(kv_file)
+        screen = screen_class(name=name)
+        screen_manager.add_widget(screen)
+        return screen
+
+    def _prewarm_next_screen(self, *args):
+        screen_manager = self.root.ids.screen_manager
+        pending = [name for name in LAZY_SCREENS if not screen_manager.has_screen(name)]
+        if pending:
+            self.ensure_screen(pending[0])
+            Clock.schedule_once(self._prewarm_next_screen, 0)
+
+    def on_pause(self):
+        if self.logic is not None:
+            self.logic.flush()
+        return True
+
+    def on_stop(self):
+        if self.logic is not None:
+            self.logic.flush()
 
     def on_switch_tabs(
         self,
@@ -52,10 +132,18 @@ class MainApp(MDApp):
         item_icon: str,
         item_text: str,
     ):
+        if self.logic is None:
+            self._pending_screen = item.name
+            return
+        self.ensure_screen(item.name)
         self.root.ids.screen_manager.current = item.name
 
     def switch_to_screen(self, screen_name: str):
         target_screen_name = f"{screen_name}_screen"
+        if self.logic is None:
+            self._pending_screen = target_screen_name
+            return
+        self.ensure_screen(target_screen_name)
         self.root.ids.screen_manager.current = target_screen_name
 
         nav_bar = self.root.ids.nav_bar
@@ -69,7 +157,7 @@ class MainApp(MDApp):
     def tap_expansion_chevron(
         self,
         panel: MDExpansionPanel,
-        chevron: TrailingPressedIconButton,
+        chevron: "TrailingPressedIconButton",
     ):
         
         if getattr(panel, '_is_animating', False):
@@ -89,6 +177,8 @@ class MainApp(MDApp):
             panel.set_chevron_down(chevron)
 
     def reset_all_data(self):
+        if self.logic is None:
+            return
         self.logic.reset_all_data()
 
         self.root.ids.screen_manager.current = "programs_screen"
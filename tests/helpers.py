@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Общие данные для тестов логики: тесты не тянут Kivy и работают только с app.logic.
+
+from __future__ import annotations
+import random
+from typing import Any, Dict, List
+
+from app.logic.storage import create_storage
+
+BACKENDS = ("json", "journal", "segmented", "sqlite")
+
+
+def make_session(session_id: int, date: str, program_id: int, exercises: Dict[int, List[tuple]]) -> Dict[str, Any]:
+    # exercises: exerciseId -> [(вес, повторы), ...]
+    return {
+        "id": session_id,
+        "date": date,
+        "programId": program_id,
+        "programName": f"P{program_id}",
+        "exercises": [
+            {
+                "exerciseId": exercise_id,
+                "exerciseName": f"E{exercise_id}",
+                "sets": [
+                    {"id": session_id * 100 + exercise_id * 10 + i, "type": "normal", "weight": w, "reps": r}
+                    for i, (w, r) in enumerate(sets)
+                ],
+            }
+            for exercise_id, sets in exercises.items()
+        ],
+    }
+
+
+def sample_history(count: int = 30, seed: int = 1) -> List[Dict[str, Any]]:
+    # по несколько тренировок в месяц на протяжении года, две программы по два упражнения
+    rnd = random.Random(seed)
+    sessions = []
+    for i in range(count):
+        program_id = 1 if i % 3 else 2
+        exercise_ids = (11, 12) if program_id == 1 else (21, 22)
+        date = f"2024-{i % 12 + 1:02d}-{i // 12 + 1:02d} 18:{i % 60:02d}:00"
+        sessions.append(make_session(1000 + i, date, program_id, {
+            exercise_id: [(rnd.choice((40.0, 42.5, 45.0, 50.0)), rnd.randint(6, 12)) for _ in range(3)]
+            for exercise_id in exercise_ids
+        }))
+    return sessions
+
+
+def by_date(history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # так историю отдаёт любое хранилище: по возрастанию даты, равные - в порядке добавления
+    return sorted(history, key=lambda s: s["date"])
+
+
+def sample_programs() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": program_id, "name": f"P{program_id}", "progressionType": "double",
+            "exercises": [{"id": program_id * 10 + k, "name": f"E{program_id * 10 + k}", "nextTarget": None} for k in (1, 2)],
+        }
+        for program_id in (1, 2)
+    ]
+
+
+def fill_storage(data_file: str, backend: str, history: List[Dict[str, Any]]) -> None:
+    storage = create_storage(data_file, backend)
+    storage.load()
+    storage.set({
+        "programs": sample_programs(), "workoutHistory": [dict(s) for s in history],
+        "userSetupComplete": True, "activeProgramId": 1,
+    })
+    storage.save()
+    storage.flush()
+    close_storage(storage)
+
+
+def read_storage(data_file: str, backend: str) -> Dict[str, Any]:
+    storage = create_storage(data_file, backend)
+    storage.load()
+    app_data = storage.get()
+    result = {
+        "programs": [p["name"] for p in app_data.get("programs", [])],
+        "activeProgramId": app_data.get("activeProgramId"),
+        "history": [dict(s) for s in storage.get_history()],
+    }
+    close_storage(storage)
+    return result
+
+
+def close_storage(storage: Any) -> None:
+    if hasattr(storage, "close"):
+        storage.close()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import pytest
+
+from app.logic import analytics
+from app.logic.analytics import FORMULAS, batch_column_stats, column_stats
+from app.logic.models import HistoryIndex, record_columns
+from app.logic.storage import create_storage
+
+from helpers import BACKENDS, close_storage, fill_storage, make_session, sample_history
+
+
+def _history():
+    history = sample_history(40, seed=5)
+    # разминка, пустая тренировка, неразобранные значения и подход с 1 повтором
+    odd = make_session(7000, "2024-05-05 10:00:00", 1, {11: [(60.0, 1), (0.0, 8)], 12: []})
+    odd["exercises"][0]["sets"] += [
+        {"id": 1, "type": "warmup", "weight": 20, "reps": 10},
+        {"id": 2, "type": "normal", "weight": "abc", "reps": 5},
+        {"id": 3, "type": "normal", "weight": "55", "reps": "x"},
+        {"id": 4, "type": "normal", "weight": 45, "reps": 40},
+    ]
+    history.append(odd)
+    return history
+
+
+def _approx(stats):
+    return {
+        "labels": stats["labels"],
+        "one_rep_max": {f: pytest.approx(v) for f, v in stats["one_rep_max"].items()},
+        "tonnage": pytest.approx(stats["tonnage"]),
+        "best_set": stats["best_set"],
+    }
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_storage_columns_match_records(tmp_path, backend):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, backend, _history())
+    storage = create_storage(data_file, backend)
+    storage.load()
+    index = HistoryIndex(sorted(_history(), key=lambda s: s["date"]))
+    for exercise_id in (11, 12, 21, 99):
+        for since in (None, "2024-05-01"):
+            expected = record_columns(index.since(exercise_id, since or ""))
+            assert storage.exercise_columns(exercise_id, since) == expected
+    close_storage(storage)
+
+
+def test_numpy_matches_python(monkeypatch):
+    np = pytest.importorskip("numpy")
+    index = HistoryIndex(sorted(_history(), key=lambda s: s["date"]))
+    columns = {ex_id: record_columns(index.entries(ex_id)) for ex_id in (11, 12, 21, 22, 99)}
+
+    monkeypatch.setattr(analytics, "_np", np)
+    with_numpy = batch_column_stats(columns, FORMULAS)
+    monkeypatch.setattr(analytics, "_np", False)
+    without_numpy = batch_column_stats(columns, FORMULAS)
+
+    assert with_numpy.keys() == without_numpy.keys()
+    for exercise_id, stats in without_numpy.items():
+        assert with_numpy[exercise_id] == _approx(stats)
+        # пакетный расчёт режется обратно в то же, что и расчёт по одному упражнению
+        assert _approx(column_stats(columns[exercise_id], FORMULAS)) == stats
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import pytest
+
+from app.logic.segmented_storage import SegmentedAppStorage
+from app.logic.storage import AppStorage, JournaledAppStorage
+
+from helpers import make_session
+
+
+def _failing_write(self, snapshot):
+    raise OSError("disk full")
+
+
+@pytest.mark.parametrize("storage_class", (JournaledAppStorage, SegmentedAppStorage))
+@pytest.mark.parametrize("write_behind", (False, True))
+def test_failed_write_is_retried_on_next_save(tmp_path, monkeypatch, storage_class, write_behind):
+    data_file = str(tmp_path / "app_data.json")
+    storage = storage_class(data_file, write_behind=write_behind)
+    storage.load()
+    storage.append_history(make_session(1, "2025-01-01 10:00:00", 1, {11: [(50.0, 8)]}))
+    storage.save()
+    storage.flush()
+
+    # запись упала и ошибка проглочена: строки журнала / грязные сегменты не должны потеряться
+    with monkeypatch.context() as m:
+        m.setattr(storage_class, "_write", _failing_write)
+        storage.append_history(make_session(2, "2025-02-01 10:00:00", 1, {11: [(52.5, 8)]}))
+        storage.save()
+        storage.flush()
+
+    storage.append_history(make_session(3, "2025-03-01 10:00:00", 1, {11: [(55.0, 8)]}))
+    storage.save()
+    storage.flush()
+
+    reloaded = storage_class(data_file)
+    reloaded.load()
+    assert [s["id"] for s in reloaded.get_history()] == [1, 2, 3]
+
+
+def test_saves_coalesced_into_one_write(tmp_path, monkeypatch):
+    storage = AppStorage(str(tmp_path / "app_data.json"), write_behind=True)
+    storage.load()
+    writes = []
+    write = AppStorage._write
+    monkeypatch.setattr(AppStorage, "_write", lambda self, snapshot: (writes.append(snapshot), write(self, snapshot)))
+    storage._saver.delay = 5
+    for i in range(20):
+        storage.append_history(make_session(i + 1, f"2025-01-{i + 1:02d} 10:00:00", 1, {11: [(50.0, 8)]}))
+        storage.save()
+    storage.flush()
+
+    assert len(writes) == 1
+    reloaded = AppStorage(storage.data_file)
+    reloaded.load()
+    assert len(reloaded.get_history()) == 20
+
+
+def test_unexpected_error_does_not_kill_saver(tmp_path):
+    storage = AppStorage(str(tmp_path / "app_data.json"), write_behind=True)
+    storage.load()
+    storage.get()["broken"] = object()
+    storage.save()
+    # json.dumps упал в потоке записи, но поток жив: очередь разбирается, flush() не виснет
+    assert storage._saver.flush(timeout=5)
+
+    del storage.get()["broken"]
+    storage.append_history(make_session(1, "2025-01-01 10:00:00", 1, {11: [(50.0, 8)]}))
+    storage.save()
+    assert storage._saver.flush(timeout=5)
+
+    reloaded = AppStorage(storage.data_file)
+    reloaded.load()
+    assert [s["id"] for s in reloaded.get_history()] == [1]
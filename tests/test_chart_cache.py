@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from app.logic.logic import ProgressiveOverloadLogic
+
+from helpers import fill_storage, make_session, sample_history
+
+
+def _fresh(logic, exercise_id):
+    # тот же ряд, посчитанный заново по истории
+    logic.service.invalidate_chart_cache()
+    return logic.get_progress_chart_data(exercise_id)
+
+
+def _logic(tmp_path, history):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", history)
+    return ProgressiveOverloadLogic(data_file)
+
+
+def test_save_patches_cached_series(tmp_path):
+    logic = _logic(tmp_path, sample_history(30))
+    before = logic.get_progress_chart_data(11)
+    exercise = logic.find_exercise_by_id(11)
+    logic.save_workout([{"exercise": exercise, "newSets": [{"id": 1, "type": "normal", "weight": 80.0, "reps": 5}]}])
+
+    cached = logic.get_progress_chart_data(11)
+    assert len(cached["labels"]) == len(before["labels"]) + 1
+    assert cached == _fresh(logic, 11)
+    # не закэшированное упражнение в кэш не попадает
+    assert 12 not in logic.service._chart_cache
+
+
+def test_delete_patches_cached_series(tmp_path):
+    history = sample_history(30)
+    # две тренировки в одну секунду: удаляется точка именно удалённой
+    history.append(make_session(5000, history[3]["date"], 1, {11: [(100.0, 5)], 12: [(40.0, 8)]}))
+    logic = _logic(tmp_path, history)
+    for exercise_id in (11, 12):
+        logic.get_progress_chart_data(exercise_id)
+
+    for session_id in (history[3]["id"], 5000, history[6]["id"]):
+        logic.delete_history_session(session_id)
+        for exercise_id in (11, 12):
+            cached = logic.get_progress_chart_data(exercise_id)
+            assert cached == _fresh(logic, exercise_id)
+            logic.get_progress_chart_data(exercise_id)
+
+
+def test_diverged_series_is_dropped_on_delete(tmp_path):
+    history = sample_history(30)
+    logic = _logic(tmp_path, history)
+    logic.get_progress_chart_data(11)
+    # точка в кэше не совпадает с историей - запись вытесняется и при следующем запросе считается заново
+    series = logic.service._chart_cache[11]
+    series["data"][series["labels"].index(history[1]["date"])] += 1.0
+    logic.delete_history_session(history[1]["id"])
+    assert 11 not in logic.service._chart_cache
+    assert logic.get_progress_chart_data(11) == _fresh(logic, 11)
+
+
+def test_import_and_reset_invalidate(tmp_path):
+    logic = _logic(tmp_path, sample_history(30))
+    logic.get_progress_chart_data(11)
+    csv_file = tmp_path / "import.csv"
+    csv_file.write_text(
+        "date,program,exercise,set_type,weight,reps\n2025-06-01 10:00:00,P1,E11,normal,90,5\n", encoding="utf-8"
+    )
+    logic.import_history(str(csv_file))
+    assert logic.get_progress_chart_data(11)["labels"][-1] == "2025-06-01 10:00:00"
+
+    logic.reset_all_data()
+    assert logic.get_progress_chart_data(11) is None
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import json
+
+from app.logic.__main__ import main
+
+from helpers import fill_storage, sample_history
+
+
+def _run(capsys, *argv):
+    status = main(list(argv))
+    return status, json.loads(capsys.readouterr().out.splitlines()[-1])
+
+
+def test_auto_backend_reads_segmented_data(tmp_path, capsys):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history())
+
+    status, output = _run(capsys, "summary", data_file)
+    assert status == 0
+    assert output["summary"]["sessions"] == 30
+
+
+def test_mismatched_backend_is_refused_without_saving(tmp_path, capsys):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history())
+    with open(data_file, encoding="utf-8") as f:
+        before = f.read()
+
+    status, output = _run(capsys, "replay", data_file, "--backend", "json")
+    assert status == 1
+    assert "segmented" in output["error"]
+    with open(data_file, encoding="utf-8") as f:
+        assert f.read() == before
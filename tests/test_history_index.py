@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import random
+
+from app.logic.models import HistoryIndex
+
+from helpers import by_date, make_session, sample_history
+
+
+def scan_last(history, exercise_id):
+    for workout_session in reversed(history):
+        for exercise_in_session in workout_session.get("exercises", []):
+            if exercise_in_session.get("exerciseId") == exercise_id:
+                return exercise_in_session
+    return None
+
+
+def scan_since(history, exercise_id, date):
+    return [
+        (workout_session["id"], exercise_in_session["exerciseId"])
+        for workout_session in history if workout_session["date"] >= date
+        for exercise_in_session in workout_session["exercises"] if exercise_in_session["exerciseId"] == exercise_id
+    ]
+
+
+def check(index, history):
+    for exercise_id in (11, 12, 21, 22, 99):
+        assert index.last(exercise_id) is scan_last(history, exercise_id)
+        for date in ("", "2024-03-01", "2024-06-02 18:05:00", "2025-01-01"):
+            got = [(r.session["id"], r.entry["exerciseId"]) for r in index.since(exercise_id, date)]
+            assert got == scan_since(history, exercise_id, date)
+
+
+def test_last_and_since_match_linear_scan():
+    history = by_date(sample_history(40))
+    check(HistoryIndex(history), history)
+
+
+def test_add_out_of_order_and_remove():
+    rnd = random.Random(3)
+    sessions = sample_history(40)
+    rnd.shuffle(sessions)
+    index = HistoryIndex()
+    history = []
+    for workout_session in sessions:
+        index.add(workout_session)
+        history.append(workout_session)
+    history = by_date(history)
+    check(index, history)
+
+    for workout_session in rnd.sample(history, 25):
+        index.remove(workout_session)
+        history.remove(workout_session)
+        check(index, history)
+    assert set(index.exercise_ids()) == {e["exerciseId"] for s in history for e in s["exercises"]}
+
+
+def test_same_date_keeps_insertion_order_and_first_entry_of_session():
+    first = make_session(1, "2024-01-01 10:00:00", 1, {11: [(50.0, 8)]})
+    second = make_session(2, "2024-01-01 10:00:00", 1, {11: [(52.5, 8)]})
+    # упражнение записано в одной сессии дважды
+    second["exercises"].append({**second["exercises"][0], "sets": []})
+    index = HistoryIndex([first, second])
+    assert index.last(11) is second["exercises"][0]
+    index.remove(second)
+    assert index.last(11) is first["exercises"][0]
+    index.remove(first)
+    assert index.last(11) is None and index.since(11, "") == []
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+from datetime import date, datetime
+
+import pytest
+
+from app.logic.logic import ProgressiveOverloadLogic
+
+from helpers import BACKENDS, by_date, fill_storage, sample_history
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_range_queries_match_filtering(tmp_path, backend):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history(40)
+    fill_storage(data_file, backend, history)
+    logic = ProgressiveOverloadLogic(data_file, backend)
+    expected = by_date(history)
+
+    assert logic.sessions_between() == expected
+    assert logic.sessions_between("2024-03-01", date(2024, 6, 1)) == [
+        s for s in expected if "2024-03-01" <= s["date"] < "2024-06-01"
+    ]
+    since = datetime(2024, 5, 2, 18, 0, 0)
+    history_since = logic.exercise_history_since(11, since)
+    assert history_since == [
+        {"date": s["date"], "sets": e["sets"]}
+        for s in expected if s["date"] >= "2024-05-02 18:00:00"
+        for e in s["exercises"] if e["exerciseId"] == 11
+    ]
+    assert logic.sessions_for_exercise_since(11, since) == history_since
+    logic.flush()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import threading
+
+import pytest
+
+from app.logic.logic import ProgressiveOverloadLogic
+from app.logic.models import IdAllocator
+
+from helpers import BACKENDS
+
+
+def test_monotonic_within_one_millisecond(monkeypatch):
+    monkeypatch.setattr("app.logic.models.time.time", lambda: 1700000000.0)
+    ids = IdAllocator()
+    issued = [ids.next() for _ in range(1000)]
+    assert issued == list(range(1700000000000, 1700000001000))
+
+
+def test_unique_across_threads(monkeypatch):
+    monkeypatch.setattr("app.logic.models.time.time", lambda: 1700000000.0)
+    ids = IdAllocator()
+    issued = []
+
+    def worker():
+        issued.extend(ids.next() for _ in range(500))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(issued)) == 2000
+
+
+def test_clock_going_back_and_observed_ids(monkeypatch):
+    now = [1700000000.0]
+    monkeypatch.setattr("app.logic.models.time.time", lambda: now[0])
+    ids = IdAllocator()
+    first = ids.next()
+    now[0] -= 60
+    assert ids.next() == first + 1
+    # id из журнала или импорта больше выданных - следующие идут после него
+    ids.observe(first + 100)
+    ids.observe("not an id")
+    ids.observe(first)
+    assert ids.next() == first + 101
+
+
+def test_legacy_file_without_last_id():
+    app_data = {"programs": [{"id": 5000000000000, "exercises": [{"id": 5000000000007}, {"id": None}]}]}
+    ids = IdAllocator(lambda: app_data)
+    assert ids.next() == 5000000000008
+    assert app_data["lastId"] == 5000000000008
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_monotonic_across_reloads(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr("app.logic.models.time.time", lambda: 1700000000.0)
+    data_file = str(tmp_path / "app_data.json")
+    logic = ProgressiveOverloadLogic(data_file, backend, session_journal=True)
+    logic.create_new_program("A", "double")
+    logic.add_exercise_to_program("A1")
+    logic.add_exercise_to_program("A2")
+    set_id = logic.add_set_to_workout(logic.get_active_program()["exercises"][0]["id"])["id"]
+    logic.flush()
+    last = logic.storage.get()["lastId"]
+    if hasattr(logic.storage, "close"):
+        logic.storage.close()
+
+    # часы те же: после перезагрузки id продолжаются с сохранённого lastId,
+    # а подход несохранённой тренировки из журнала сдвигает его дальше
+    reloaded = ProgressiveOverloadLogic(data_file, backend, session_journal=True)
+    assert reloaded.storage.get()["lastId"] == last
+    reloaded.add_exercise_to_program("A3")
+    new_id = reloaded.get_active_program()["exercises"][-1]["id"]
+    assert new_id == last + 1 and new_id > set_id
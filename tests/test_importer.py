@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import json
+
+import pytest
+
+from app.logic.importer import ImportValidationError
+from app.logic.logic import ProgressiveOverloadLogic
+
+HEADER = "date,program,exercise,weight,reps"
+
+
+def _write(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _logic(tmp_path, backend="json"):
+    return ProgressiveOverloadLogic(str(tmp_path / "app_data.json"), backend)
+
+
+def _shape(logic):
+    return [
+        (s["date"], s["programName"], [(e["exerciseName"], [(x["weight"], x["reps"]) for x in e["sets"]]) for e in s["exercises"]])
+        for s in logic.sessions_between()
+    ]
+
+
+def test_csv_rows_grouped_across_file(tmp_path):
+    # файл отсортирован по упражнению, а Жим тренировки 1 января разбит на два куска
+    src = _write(tmp_path / "in.csv", [
+        HEADER,
+        "2025-01-01 10:00,A,Жим,50,8",
+        "2025-01-01 10:00,A,Жим,50,8",
+        "2025-01-03 10:00,A,Жим,52.5,8",
+        "2025-01-01 10:00,A,Присед,80,5",
+        "2025-01-03 10:00,A,Присед,82.5,5",
+        "2025-01-01 10:00,A,Жим,50,7",
+    ])
+    logic = _logic(tmp_path)
+    report = logic.import_history(src)
+
+    assert (report.sessions, report.sets, report.duplicates) == (2, 6, 0)
+    assert (report.programs_created, report.exercises_created) == (1, 2)
+    assert _shape(logic) == [
+        ("2025-01-01 10:00:00", "A", [("Жим", [(50.0, 8), (50.0, 8), (50.0, 7)]), ("Присед", [(80.0, 5)])]),
+        ("2025-01-03 10:00:00", "A", [("Жим", [(52.5, 8)]), ("Присед", [(82.5, 5)])]),
+    ]
+
+
+def test_reimport_counts_duplicates(tmp_path):
+    src = _write(tmp_path / "in.csv", [
+        HEADER,
+        "2025-01-01 10:00,A,Жим,50,8",
+        "2025-01-02 10:00,A,Жим,50,9",
+        "2025-01-02 10:00,B,Жим,40,9",
+    ])
+    logic = _logic(tmp_path)
+    assert logic.import_history(src).sessions == 3
+
+    report = logic.import_history(src)
+    assert (report.sessions, report.duplicates, report.sets) == (0, 3, 0)
+    assert len(logic.sessions_between()) == 3
+
+
+def test_strict_rejects_whole_file(tmp_path):
+    src = _write(tmp_path / "in.csv", [
+        HEADER,
+        "2025-01-01 10:00,A,Жим,50,8",
+        "not a date,A,Жим,50,8",
+        "2025-01-02 10:00,A,Жим,abc,8",
+    ])
+    logic = _logic(tmp_path)
+    with pytest.raises(ImportValidationError) as info:
+        logic.import_history(src)
+    assert [line for line, _ in info.value.errors] == [3, 4]
+    assert logic.sessions_between() == []
+    assert logic.list_programs() == []
+
+
+def test_lenient_skips_bad_rows(tmp_path):
+    src = _write(tmp_path / "in.csv", [
+        HEADER,
+        "2025-01-01 10:00,A,Жим,50,8",
+        "not a date,A,Жим,50,8",
+        "2025-01-02 10:00,A,Жим,2000,8",
+        "2025-01-02 10:00,A,Жим,55,8",
+    ])
+    logic = _logic(tmp_path)
+    report = logic.import_history(src, strict=False)
+
+    assert (report.sessions, report.sets) == (2, 2)
+    assert [line for line, _ in report.errors] == [3, 4]
+
+
+def test_missing_columns(tmp_path):
+    src = _write(tmp_path / "in.csv", ["date,exercise", "2025-01-01,Жим"])
+    with pytest.raises(ImportValidationError):
+        _logic(tmp_path).import_history(src)
+
+
+@pytest.mark.parametrize("backend", ("json", "segmented", "sqlite"))
+def test_json_import_matches_existing_program(tmp_path, backend):
+    logic = _logic(tmp_path, backend)
+    logic.create_new_program("A", "double")
+    logic.add_exercise_to_program("Жим")
+    program = logic.list_programs()[0]
+    exercise_id = program["exercises"][0]["id"]
+
+    sessions = [
+        {"date": "2025-01-01 10:00:00", "programName": "A", "exercises": [
+            {"exerciseName": "Жим", "sets": [{"weight": 50, "reps": 10}] * 3},
+        ]},
+        {"date": "2025-01-03 10:00:00", "programId": program["id"], "exercises": [
+            {"exerciseId": exercise_id, "exerciseName": "Жим", "sets": [{"weight": 50, "reps": 11}] * 3},
+        ]},
+    ]
+    src = tmp_path / "in.jsonl"
+    src.write_text("\n".join(json.dumps(s, ensure_ascii=False) for s in sessions) + "\n", encoding="utf-8")
+    report = logic.import_history(str(src))
+
+    assert (report.sessions, report.programs_created, report.exercises_created) == (2, 0, 0)
+    assert [e["exerciseId"] for s in logic.sessions_between() for e in s["exercises"]] == [exercise_id] * 2
+    assert logic.find_exercise_by_id(exercise_id)["nextTarget"]["weight"] == 51.25
+
+
+def test_session_id_separates_same_second(tmp_path):
+    # две разные тренировки одной программы в одну секунду различаются только session_id
+    src = _write(tmp_path / "in.csv", [
+        "session_id,date,program,exercise,weight,reps",
+        "1,2025-01-01 10:00,A,Жим,50,8",
+        "2,2025-01-01 10:00,A,Жим,60,5",
+        "1,2025-01-01 10:00,A,Жим,50,7",
+    ])
+    logic = _logic(tmp_path)
+    report = logic.import_history(src)
+    assert (report.sessions, report.duplicates) == (2, 0)
+    assert sorted(sets for _, _, [(_, sets)] in _shape(logic)) == [[(50.0, 8), (50.0, 7)], [(60.0, 5)]]
+
+    # повторный импорт того же файла - обе уже в истории
+    report = logic.import_history(src)
+    assert (report.sessions, report.duplicates) == (0, 2)
+    assert len(logic.sessions_between()) == 2
+
+
+def test_json_ids_in_same_second(tmp_path):
+    def session(session_id, weight):
+        return {
+            "id": session_id, "date": "2025-01-01 10:00:00", "programName": "A",
+            "exercises": [{"exerciseName": "Жим", "sets": [{"weight": weight, "reps": 8}]}],
+        }
+
+    # одинаковый id или сессия без id в ту же секунду - по-прежнему дубль
+    sessions = [session(1, 50), session(2, 55), session(1, 50), session(None, 60)]
+    src = _write(tmp_path / "in.jsonl", [json.dumps(s) for s in sessions])
+    logic = _logic(tmp_path)
+    report = logic.import_history(src)
+    assert (report.sessions, report.duplicates) == (2, 2)
+
+    # в истории уже две тренировки этой секунды: третья новая из файла добавляется
+    sessions.append(session(3, 65))
+    src = _write(tmp_path / "in.jsonl", [json.dumps(s) for s in sessions])
+    report = logic.import_history(src)
+    assert (report.sessions, report.duplicates) == (1, 4)
+    assert [s["exercises"][0]["sets"][0]["weight"] for s in logic.sessions_between()] == [50.0, 55.0, 65.0]
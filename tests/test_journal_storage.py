@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+from app.logic.storage import JournaledAppStorage
+
+from helpers import make_session
+
+
+def test_journal_replayed_on_load(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    storage = JournaledAppStorage(data_file)
+    storage.load()
+    for i in range(3):
+        storage.append_history(make_session(i + 1, f"2025-01-0{i + 1} 10:00:00", 1, {11: [(50.0, 8)]}))
+        storage.save()
+    storage.remove_history(2)
+    storage.get()["activeProgramId"] = 7
+    storage.save()
+
+    reloaded = JournaledAppStorage(data_file)
+    reloaded.load()
+    assert [s["id"] for s in reloaded.get_history()] == [1, 3]
+    assert reloaded.get()["activeProgramId"] == 7
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from app.logic.logic import ProgressiveOverloadLogic
+from app.logic.models import ProgramRegistry, find_exercise_by_id, get_program_by_id
+
+
+def check(registry, programs):
+    # реестр отвечает так же, как линейный поиск по app_data["programs"]
+    app_data = {"programs": programs}
+    program_ids = {p.get("id") for p in programs} | {-1}
+    exercise_ids = {e.get("id") for p in programs for e in p["exercises"]} | {-1}
+    for program_id in program_ids:
+        assert registry.program(program_id) is get_program_by_id(app_data, program_id)
+    for exercise_id in exercise_ids:
+        assert find_exercise_by_id(app_data, exercise_id, registry) == find_exercise_by_id(app_data, exercise_id)
+
+
+def test_registry_follows_program_and_exercise_edits(tmp_path):
+    logic = ProgressiveOverloadLogic(str(tmp_path / "app_data.json"))
+    for name in ("A", "B", "C"):
+        logic.create_new_program(name, "double")
+        for k in range(3):
+            logic.add_exercise_to_program(f"{name}{k}")
+    programs = logic.storage.get()["programs"]
+    check(logic.storage.registry, programs)
+
+    logic.select_program(programs[0]["id"])
+    logic.delete_exercise(programs[0]["exercises"][1]["id"])
+    logic.delete_program(programs[1]["id"])
+    logic.add_exercise_to_program("A3")
+    programs = logic.storage.get()["programs"]
+    check(logic.storage.registry, programs)
+    assert logic.get_active_program() is programs[0]
+
+    # после перезагрузки реестр строится заново из сохранённых программ
+    reloaded = ProgressiveOverloadLogic(logic.storage.data_file)
+    check(reloaded.storage.registry, reloaded.storage.get()["programs"])
+
+
+def test_duplicate_ids_fall_back_to_next_match():
+    first = {"id": 1, "exercises": [{"id": 10}, {"id": 11}]}
+    second = {"id": 1, "exercises": [{"id": 10}]}
+    programs = [first, second]
+    registry = ProgramRegistry(programs)
+    check(registry, programs)
+
+    registry.remove_program(first)
+    programs.remove(first)
+    check(registry, programs)
+    registry.remove_exercise(second["exercises"][0])
+    second["exercises"].clear()
+    check(registry, programs)
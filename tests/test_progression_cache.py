@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import pytest
+
+from app.logic.progression import (
+    LRUCache, calculate_next_target, check_goal_achievement, clear_progression_cache, progression_cache_info,
+)
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    clear_progression_cache()
+    yield
+    clear_progression_cache()
+
+
+def _workout(*pairs):
+    return {"sets": [{"type": "normal", "weight": w, "reps": r} for w, r in pairs]}
+
+
+def test_lru_counts_and_evicts():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    # "b" использовался давнее всех и вытеснен, "a" остался
+    missing = cache.get("b")
+    assert missing is not None and missing not in (1, 2, 3)
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.info() == {"hits": 3, "misses": 1, "size": 2, "maxsize": 2}
+    cache.clear()
+    assert cache.info() == {"hits": 0, "misses": 0, "size": 0, "maxsize": 2}
+
+
+def test_next_target_hits_and_copies():
+    exercise = {"nextTarget": {"weight": 50.0, "reps": 8}}
+    first = calculate_next_target(exercise, _workout((50, 8), (50, 8), (50, 8)), "double")
+    # те же подходы, строками и с другими id - тот же ключ
+    second = calculate_next_target(exercise, _workout(("50", "8"), (50.0, 8), (50, 8.0)), "double")
+    assert first == second and first is not second
+    assert progression_cache_info()["next_target"]["hits"] == 1
+    assert progression_cache_info()["next_target"]["misses"] == 1
+
+    # правка возвращённой цели (как nextTarget в программе) не портит кэш
+    first["weight"] = 999.0
+    first["text"] = "changed"
+    assert calculate_next_target(exercise, _workout((50, 8), (50, 8), (50, 8)), "double") == second
+
+
+def test_goal_cache_counts():
+    exercise = {"nextTarget": {"weight": 50.0, "reps": 8}}
+    sets = _workout((50, 8), (50, 8), (50, 8))["sets"]
+    assert check_goal_achievement(exercise, sets, "double")
+    assert check_goal_achievement(exercise, sets, "double")
+    assert not check_goal_achievement(exercise, _workout((50, 7), (50, 8), (50, 8))["sets"], "double")
+    assert progression_cache_info()["goal"] == {"hits": 1, "misses": 2, "size": 2, "maxsize": 256}
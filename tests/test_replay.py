@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from app.logic.logic import ProgressiveOverloadLogic
+from app.logic.plan import ExercisePlan
+from app.logic.replay import ReplayEngine
+
+from helpers import by_date, fill_storage, make_session, sample_history
+
+
+def _reference(logic):
+    # полный прогон истории тем же путём, что и сохранение тренировки (ExercisePlan.outcome)
+    exercises = {}
+    for session in logic.sessions_between():
+        for entry in session["exercises"]:
+            exercise = exercises.setdefault(entry["exerciseId"], {"nextTarget": None})
+            outcome = ExercisePlan(exercise, "double", None, {}, "", "").outcome(entry["sets"])
+            if outcome is not None and outcome.goal_achieved:
+                exercise["nextTarget"] = dict(outcome.next_target)
+    return exercises
+
+
+def _targets(logic):
+    return {e["id"]: e["nextTarget"] for p in logic.list_programs() for e in p["exercises"]}
+
+
+def _history_with_same_dates():
+    # часть тренировок в одну и ту же секунду: точки должны различать их внутри даты
+    history = sample_history(120, seed=7)
+    for i, session in enumerate(history[::5]):
+        twin = make_session(9000 + i, session["date"], session["programId"], {
+            e["exerciseId"]: [(s["weight"] + 2.5, s["reps"]) for s in e["sets"]] for e in session["exercises"]
+        })
+        history.append(twin)
+    return history
+
+
+@pytest.mark.parametrize("backend", ("json", "segmented", "sqlite"))
+def test_replay_after_deletes_matches_full_reference(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(ReplayEngine, "CHECKPOINT_EVERY", 4)
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, backend, _history_with_same_dates())
+    logic = ProgressiveOverloadLogic(data_file, backend)
+    logic.replay_targets(full=True, parallel=False)
+
+    def check():
+        reference = _reference(logic)
+        assert _targets(logic) == {
+            ex_id: reference[ex_id]["nextTarget"] if ex_id in reference else None for ex_id in _targets(logic)
+        }
+
+    check()
+    rnd = random.Random(3)
+    sessions = logic.sessions_between()
+    for _ in range(25):
+        victim = sessions.pop(rnd.randrange(len(sessions)))
+        logic.delete_history_session(victim["id"])
+        check()
+
+    engine = logic.service.replay
+    for ex_id in _targets(logic):
+        records = len(logic.storage.exercise_records(ex_id))
+        assert len(engine.checkpoints(ex_id)) <= records // engine.CHECKPOINT_EVERY + 1
+
+
+def test_delete_last_session_replays_only_tail(tmp_path, monkeypatch):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", sample_history(100))
+    logic = ProgressiveOverloadLogic(data_file, "json")
+    logic.replay_targets(full=True, parallel=False)
+    engine = logic.service.replay
+
+    replayed = []
+    run_job = engine._job
+    monkeypatch.setattr(engine, "_job", lambda ex_id: replayed.append(run_job(ex_id)) or replayed[-1])
+    logic.delete_history_session(logic.sessions_between()[-1]["id"])
+
+    assert replayed and all(len(job.records) < engine.CHECKPOINT_EVERY for job in replayed)
+
+
+def test_serial_and_parallel_agree(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", sample_history(60))
+    logic = ProgressiveOverloadLogic(data_file, "json")
+    engine = logic.service.replay
+    exercise_ids = list(_targets(logic))
+
+    serial = engine.replay(exercise_ids, full=True, parallel=False)
+    parallel = engine.replay(exercise_ids, full=True, parallel=True)
+    assert serial == parallel
+
+
+def test_import_never_uses_process_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReplayEngine, "PARALLEL_MIN_RECORDS", 0)
+
+    def no_pool(self, jobs, workers):
+        raise AssertionError("process pool used outside the CLI")
+
+    monkeypatch.setattr(ReplayEngine, "_run_parallel", no_pool)
+    src = tmp_path / "in.csv"
+    src.write_text(
+        "date,program,exercise,weight,reps\n"
+        + "".join(f"2025-01-{d:02d} 10:00,A,{name},50,8\n" for d in range(1, 20) for name in ("Жим", "Присед")),
+        encoding="utf-8",
+    )
+    logic = ProgressiveOverloadLogic(str(tmp_path / "app_data.json"), "json")
+    assert logic.import_history(str(src)).targets_updated == 2
+
+
+def test_logic_import_does_not_load_process_pool():
+    # пул импортируется только при параллельном replay
+    code = (
+        "import sys; import app.logic.logic; "
+        "assert 'concurrent.futures.process' not in sys.modules, 'process pool imported eagerly'"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+
+def _recording_jobs(monkeypatch, logic):
+    engine = logic.service.replay
+    jobs = []
+    run_job = engine._job
+    monkeypatch.setattr(engine, "_job", lambda ex_id: jobs.append(run_job(ex_id)) or jobs[-1])
+    return jobs
+
+
+@pytest.mark.parametrize("backend", ("json", "journal", "segmented", "sqlite"))
+def test_cold_start_delete_resumes_from_saved_checkpoints(tmp_path, monkeypatch, backend):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, backend, sample_history(200))
+    warm = ProgressiveOverloadLogic(data_file, backend)
+    warm.replay_targets(full=True, parallel=False)
+    warm.flush()
+    if hasattr(warm.storage, "close"):
+        warm.storage.close()
+
+    # новый запуск: точки в памяти ещё нет, они читаются из сохранённых данных
+    logic = ProgressiveOverloadLogic(data_file, backend)
+    jobs = _recording_jobs(monkeypatch, logic)
+    victim = logic.sessions_between()[-5]
+    logic.delete_history_session(victim["id"])
+
+    assert jobs and all(len(job.records) < ReplayEngine.CHECKPOINT_EVERY for job in jobs)
+    assert all(job.target is not None for job in jobs)
+    reference = _reference(logic)
+    assert {ex_id: target for ex_id, target in _targets(logic).items() if ex_id in reference} == {
+        ex_id: reference[ex_id]["nextTarget"] for ex_id in reference
+    }
+
+
+def test_cold_start_delete_without_checkpoints_skips_replay(tmp_path, monkeypatch):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", sample_history(200))
+    logic = ProgressiveOverloadLogic(data_file, "json")
+    jobs = _recording_jobs(monkeypatch, logic)
+
+    victim = logic.sessions_between()[-1]
+    logic.delete_history_session(victim["id"])
+    # история ни разу не прогонялась: цель - по последней оставшейся тренировке, без прохода по истории
+    assert jobs == []
+    for entry in victim["exercises"]:
+        last = logic.get_last_workout_for_exercise(entry["exerciseId"])
+        expected = ExercisePlan({"nextTarget": None}, "double", None, {}, "", "").outcome(last["sets"]).next_target
+        assert logic.find_exercise_by_id(entry["exerciseId"])["nextTarget"] == expected
+
+
+def test_stale_saved_checkpoint_falls_back_to_full_replay(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", sample_history(100))
+    warm = ProgressiveOverloadLogic(data_file, "json")
+    warm.replay_targets(full=True, parallel=False)
+
+    # история поменялась мимо приложения: последняя тренировка подменена другой с той же датой
+    history = by_date(sample_history(100))
+    history[-1] = make_session(5000, history[-1]["date"], history[-1]["programId"], {
+        e["exerciseId"]: [(100.0, 12)] * 3 for e in history[-1]["exercises"]
+    })
+    storage = warm.storage
+    storage.set({**storage.get(), "workoutHistory": history})
+    storage.save()
+
+    logic = ProgressiveOverloadLogic(data_file, "json")
+    engine = logic.service.replay
+    ex_id = history[-1]["exercises"][0]["exerciseId"]
+    job = engine._job(ex_id)
+    assert job.target is None and len(job.records) == len(logic.storage.exercise_records(ex_id))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import os
+
+import pytest
+
+from app.logic.segmented_storage import SegmentedAppStorage
+from app.logic.storage import JournaledAppStorage, create_storage, detect_backend
+
+from helpers import by_date, fill_storage, make_session, read_storage, sample_history
+
+
+@pytest.mark.parametrize("source", ("json", "journal", "sqlite"))
+def test_migration_keeps_history(tmp_path, source):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history()
+    fill_storage(data_file, source, history)
+
+    data = read_storage(data_file, "segmented")
+    assert data["programs"] == ["P1", "P2"]
+    assert data["history"] == by_date(history)
+    assert detect_backend(data_file) == "segmented"
+    assert read_storage(data_file, "segmented")["history"] == by_date(history)
+
+
+def test_migration_drops_journal(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "journal", sample_history(5))
+    storage = JournaledAppStorage(data_file)
+    storage.load()
+    storage.append_history(make_session(5000, "2025-02-01 10:00:00", 1, {11: [(60.0, 8)]}))
+    storage.save()
+    assert os.path.exists(data_file + ".journal")
+
+    data = read_storage(data_file, "segmented")
+    assert len(data["history"]) == 6
+    assert not os.path.exists(data_file + ".journal")
+
+
+def test_history_split_by_month(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history()
+    fill_storage(data_file, "segmented", history)
+
+    storage = SegmentedAppStorage(data_file)
+    storage.load()
+    months = sorted({s["date"][:7] for s in history})
+    assert sorted(os.listdir(storage.history_dir)) == [f"{m}.json" for m in months]
+    # запрос за месяц читает только его сегмент
+    assert [s["id"] for s in storage.sessions_between("2024-03-01", "2024-03-31 23:59:59")] == [
+        s["id"] for s in by_date(history) if s["date"].startswith("2024-03")
+    ]
+    assert list(storage._segments) == ["2024-03"]
+
+
+def test_newer_sqlite_database_is_picked_up(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+
+    # CLI с --backend sqlite перелил данные в базу и поменял там историю
+    sqlite = create_storage(data_file, "sqlite")
+    sqlite.load()
+    for session in sample_history(10)[:4]:
+        sqlite.remove_history(session["id"])
+    later = make_session(5000, "2026-01-15 10:00:00", 1, {11: [(60.0, 8)]})
+    sqlite.append_history(later)
+    sqlite.save()
+    sqlite.close()
+    os.utime(data_file, (1, 1))
+
+    data = read_storage(data_file, "segmented")
+    assert data["history"] == by_date(sample_history(10)[4:] + [later])
+    # месяцы, которых больше нет в истории, не остались на диске
+    history_dir = str(tmp_path / "app_data.history")
+    assert sorted(os.listdir(history_dir)) == sorted({f"{s['date'][:7]}.json" for s in data["history"]})
+
+
+def test_failed_write_racing_a_save_keeps_dirty_segments(tmp_path, monkeypatch):
+    storage = SegmentedAppStorage(str(tmp_path / "app_data.json"))
+    storage.load()
+    storage.append_history(make_session(1, "2025-01-01 10:00:00", 1, {11: [(50.0, 8)]}))
+    failed = storage._snapshot(detached=True)
+    # пока поток записи разбирается с ошибкой, основной поток уже снял следующий снимок
+    storage.append_history(make_session(2, "2025-02-01 10:00:00", 1, {11: [(52.5, 8)]}))
+    newer = storage._snapshot(detached=True)
+    storage._write_failed(failed)
+    storage._write(newer)
+    storage.save()
+
+    reloaded = SegmentedAppStorage(storage.data_file)
+    reloaded.load()
+    assert [s["id"] for s in reloaded.get_history()] == [1, 2]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import json
+
+from app.logic.logic import ProgressiveOverloadLogic
+
+from helpers import fill_storage, sample_history
+
+
+def _logic(data_file):
+    return ProgressiveOverloadLogic(data_file, "segmented", write_behind=True, session_journal=True)
+
+
+def _workout(logic):
+    # незавершённая тренировка: два упражнения, правки, ошибка валидации и удалённый подход
+    first = logic.add_set_to_workout(11)
+    logic.update_set_in_workout(11, first["id"], "weight", "50")
+    logic.update_set_in_workout(11, first["id"], "reps", "8")
+    dropped = logic.add_set_to_workout(11)
+    logic.delete_set_from_workout(11, dropped["id"])
+    second = logic.add_set_to_workout(12)
+    logic.update_set_in_workout(12, second["id"], "weight", "4o")
+    logic.update_set_error_state(12, second["id"], "weight", True)
+    logic.flush()
+    return logic.get_current_workout_state()
+
+
+def test_workout_restored_after_kill(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+    logic = _logic(data_file)
+    state = _workout(logic)
+
+    # процесс убит: следующий запуск поднимает тренировку из журнала, не сохраняя и не закрывая прежний
+    restored = _logic(data_file)
+    assert restored.get_current_workout_state() == state
+    assert restored.has_validation_errors()
+    # новые id не пересекаются с восстановленными подходами
+    new_set = restored.add_set_to_workout(11)
+    assert new_set["id"] > max(s["id"] for sets in state.values() for s in sets)
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+    state = _workout(_logic(data_file))
+    with open(data_file + ".session", "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "exerciseId": 11, "set": {"id": ')
+
+    assert _logic(data_file).get_current_workout_state() == state
+
+
+def test_journal_of_other_program_is_not_restored(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+    logic = _logic(data_file)
+    _workout(logic)
+    logic.select_program(1)
+    logic.flush()
+
+    # между запусками активной стала другая программа - журнал от программы 1 не подходит
+    with open(data_file, "r", encoding="utf-8") as f:
+        app_data = json.load(f)
+    app_data["activeProgramId"] = 2
+    with open(data_file, "w", encoding="utf-8") as f:
+        json.dump(app_data, f)
+
+    other = _logic(data_file)
+    assert other.get_current_workout_state() == {21: [], 22: []}
+    assert not other.has_validation_errors()
+    # первая же правка начинает журнал заново для программы 2
+    other.add_set_to_workout(21)
+    other.flush()
+    with open(data_file + ".session", "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records[0] == {"op": "start", "programId": 2}
+    assert _logic(data_file).get_current_workout_state() == other.get_current_workout_state()
+
+
+def test_saved_workout_is_not_restored(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+    logic = _logic(data_file)
+    _workout(logic)
+    exercise = logic.find_exercise_by_id(11)
+    logic.save_workout([{"exercise": exercise, "newSets": logic.get_current_workout_state()[11]}])
+    logic.flush()
+
+    restored = _logic(data_file)
+    assert restored.get_current_workout_state() == {11: [], 12: []}
+    assert len(restored.list_workout_history()) == 11
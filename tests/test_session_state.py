@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import random
+
+from app.logic.session_state import SessionState
+
+
+def _scan(state):
+    # как проверка до счётчика: обход всех подходов
+    return sum(
+        1 for sets in state.snapshot().values() for s in sets
+        for prop in ("weight", "reps") if s.get("errors", {}).get(prop, False)
+    )
+
+
+def test_error_counter_matches_full_scan():
+    rnd = random.Random(11)
+    state = SessionState()
+    state.init_for_program({"id": 1, "exercises": [{"id": 11}, {"id": 12}]})
+    exercise_ids = [11, 12]
+    for step in range(2000):
+        op = rnd.random()
+        exercise_id = rnd.choice(exercise_ids)
+        sets = state.sets(exercise_id)
+        if op < 0.25 or not sets:
+            state.add_set(exercise_id)
+        elif op < 0.35:
+            state.delete_set(exercise_id, rnd.choice(sets)["id"])
+        elif op < 0.8:
+            # флаги ошибок, в том числе повторные и по непроверяемому полю
+            state.update_set_error(exercise_id, rnd.choice(sets)["id"], rnd.choice(("weight", "reps", "type")), rnd.random() < 0.5)
+        elif op < 0.85:
+            state.update_set(exercise_id, rnd.choice(sets)["id"], "weight", str(rnd.randint(0, 100)))
+        elif op < 0.9:
+            state.remove_exercise(exercise_id)
+            state.add_exercise(exercise_id)
+        elif op < 0.92:
+            state.update_set_error(exercise_id, -1, "weight", True)
+        assert state._error_count == _scan(state), step
+        assert state.has_validation_errors() == (_scan(state) > 0)
+
+
+def test_counter_reset_with_new_workout():
+    state = SessionState()
+    program = {"id": 1, "exercises": [{"id": 11}]}
+    state.init_for_program(program)
+    s = state.add_set(11)
+    state.update_set_error(11, s["id"], "reps", True)
+    assert state.has_validation_errors()
+    state.init_for_program(program)
+    assert not state.has_validation_errors()
+    state.reset()
+    assert state.snapshot() == {} and not state.has_validation_errors()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import os
+
+import pytest
+
+from app.logic.segmented_storage import SegmentedAppStorage
+from app.logic.storage import detect_backend
+
+from helpers import by_date, fill_storage, make_session, read_storage, sample_history
+
+
+@pytest.mark.parametrize("source", ("json", "journal", "segmented"))
+def test_migration_keeps_history(tmp_path, source):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history()
+    fill_storage(data_file, source, history)
+
+    data = read_storage(data_file, "sqlite")
+    assert data["programs"] == ["P1", "P2"]
+    assert data["history"] == by_date(history)
+    assert detect_backend(data_file) == "sqlite"
+    # второе открытие читает уже базу
+    assert read_storage(data_file, "sqlite")["history"] == by_date(history)
+
+
+def test_newer_json_is_migrated_again(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "segmented", sample_history(10))
+    assert len(read_storage(data_file, "sqlite")["history"]) == 10
+
+    # приложение дописало тренировку в свой формат уже после миграции
+    later = make_session(5000, "2025-02-01 10:00:00", 1, {11: [(60.0, 8)]})
+    storage = SegmentedAppStorage(data_file)
+    storage.load()
+    storage.append_history(later)
+    storage.save()
+    os.utime(str(tmp_path / "app_data.db"), (1, 1))
+
+    data = read_storage(data_file, "sqlite")
+    assert data["history"] == by_date(sample_history(10) + [later])
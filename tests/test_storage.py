@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+import pytest
+
+from app.logic.storage import create_storage, detect_backend
+
+from helpers import BACKENDS, by_date, fill_storage, make_session, read_storage, sample_history
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_trip(tmp_path, backend):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history()
+    fill_storage(data_file, backend, history)
+
+    data = read_storage(data_file, backend)
+    assert data["programs"] == ["P1", "P2"]
+    assert data["activeProgramId"] == 1
+    assert data["history"] == by_date(history)
+    assert detect_backend(data_file) == backend
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_append_and_remove_survive_reload(tmp_path, backend):
+    data_file = str(tmp_path / "app_data.json")
+    history = sample_history(12)
+    fill_storage(data_file, backend, history)
+
+    storage = create_storage(data_file, backend)
+    storage.load()
+    extra = make_session(5000, "2025-02-01 10:00:00", 1, {11: [(60.0, 8)] * 3})
+    storage.append_history(extra)
+    assert storage.remove_history(history[3]["id"])["id"] == history[3]["id"]
+    storage.save()
+    if hasattr(storage, "close"):
+        storage.close()
+
+    expected = by_date([s for s in history if s["id"] != history[3]["id"]] + [extra])
+    assert read_storage(data_file, backend)["history"] == expected
+
+
+def test_detect_backend_missing_file(tmp_path):
+    assert detect_backend(str(tmp_path / "nothing.json")) is None
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from app.logic.logic import ProgressiveOverloadLogic
+from app.logic.plan import WorkoutPlan
+
+from helpers import fill_storage, sample_history
+
+
+def _logic(tmp_path):
+    data_file = str(tmp_path / "app_data.json")
+    fill_storage(data_file, "json", sample_history(30))
+    return ProgressiveOverloadLogic(data_file)
+
+
+def _sets(*pairs):
+    return [{"id": i, "type": "normal", "weight": w, "reps": r} for i, (w, r) in enumerate(pairs)]
+
+
+def test_plan_reused_until_history_or_programs_change(tmp_path, monkeypatch):
+    logic = _logic(tmp_path)
+    plan = logic.get_workout_plan()
+    assert logic.get_workout_plan() is plan
+
+    # пока ничего не менялось, прошлая тренировка повторно из хранилища не читается
+    calls = []
+    last_workout = logic.storage.last_workout_for_exercise
+    monkeypatch.setattr(logic.storage, "last_workout_for_exercise", lambda ex_id: calls.append(ex_id) or last_workout(ex_id))
+    exercise = logic.find_exercise_by_id(11)
+    items = [{"exercise": exercise, "newSets": _sets((100.0, 12), (100.0, 12), (100.0, 12))}]
+    logic.generate_workout_summary(items)
+    assert calls == [] and logic.get_workout_plan() is plan
+
+    logic.save_workout(items)
+    rebuilt = logic.get_workout_plan()
+    assert rebuilt is not plan and sorted(calls) == [11, 12]
+    assert rebuilt.get(11).last_workout["sets"] == items[0]["newSets"]
+
+    logic.add_exercise_to_program("E13")
+    assert logic.get_workout_plan() is not rebuilt
+
+    # выбор другой программы - план другой программы
+    logic.select_program(2)
+    assert logic.get_workout_plan().program is logic.get_program_by_id(2)
+
+
+def test_outcome_is_cached_per_working_sets(tmp_path):
+    logic = _logic(tmp_path)
+    exercise_plan = logic.get_workout_plan().get(11)
+    first = exercise_plan.outcome(_sets((100.0, 12), (100.0, 12), (100.0, 12)))
+    # те же рабочие подходы с другими id и разминкой - тот же результат
+    again = exercise_plan.outcome([{"type": "warmup", "weight": 20, "reps": 10}] + _sets((100.0, 12), (100.0, 12), (100.0, 12)))
+    assert again is first and first.goal_achieved
+    assert exercise_plan.outcome([{"type": "warmup", "weight": 20, "reps": 10}]) is None
+
+
+def test_duplicate_exercise_ids_keep_first():
+    class Storage:
+        def last_workout_for_exercise(self, exercise_id):
+            return None
+
+    first = {"id": 1, "name": "A", "nextTarget": None}
+    program = {"id": 7, "progressionType": "double", "exercises": [first, {"id": 1, "name": "B", "nextTarget": None}]}
+    plan = WorkoutPlan.build(program, Storage(), revision=3)
+    assert list(plan.exercises) == [1]
+    assert plan.get(1).exercise is first and plan.revision == 3
+    assert WorkoutPlan.build(None, Storage(), revision=3) is None